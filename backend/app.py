@@ -1,28 +1,248 @@
-from flask import Flask, jsonify, request, send_from_directory
+import time
+
+# Start of the startup breakdown reported by /api/health
+_import_start = time.perf_counter()
+
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
+import atexit
+import hmac
+import json
 import os
+import re
 import sys
+import threading
 
 # Add backend to path so we can import modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
 
-from database.db import Database
+from database.db import Database, DEFAULT_USER_ID
+from database.submission_sink import SubmissionSink
+from services.batch_grader import BatchGrader
 from services.code_executor import CodeExecutor
+from services.lesson_bundle import LessonBundle
+from services.metrics import REGISTRY, http_request_seconds
+from services.progress_events import MAX_EVENTS, parse_events, parse_sync_token
+from services.session_manager import SessionManager
+from services.static_assets import StaticAssets
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend')
 
-# Initialize Flask app with frontend static files
-app = Flask(__name__,
-            static_folder='../frontend',
-            static_url_path='/')
+# Initialize Flask app, frontend files are served by serve_frontend
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
-# Initialize database and executor
-db = Database()
-executor = CodeExecutor(timeout=5, max_output=10000)
+# Milliseconds spent on each startup step
+startup_timings = {}
+
+class LazyService:
+    """A service built by the first request that needs it
+
+    Keeps the database, the worker processes and the lesson files out of
+    the startup path, so a new instance answers /api/health right away.
+    """
+
+    def __init__(self, name, factory, requires=()):
+        self.name = name
+        self.factory = factory
+        self.requires = requires
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        instance = self._instance
+        if instance is None:
+            # Dependencies first, so each service is timed on its own
+            for service in self.requires:
+                service()
+
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = self.factory()
+                    startup_timings[self.name] = round((time.perf_counter() - start) * 1000, 1)
+                instance = self._instance
+        return instance
+
+    @property
+    def created(self):
+        return self._instance is not None
+
+# DATABASE_PATH overrides the default database file
+get_db = LazyService('database', lambda: Database(os.environ.get('DATABASE_PATH') or None))
+
+get_executor = LazyService('executor', lambda: CodeExecutor(
+    timeout=5,
+    max_output=10000,
+    workers=int(os.environ.get('EXECUTOR_WORKERS', 4))
+))
+
+# Submissions are written in the background, flushed on shutdown before the database closes
+get_submission_sink = LazyService(
+    'submission_sink',
+    lambda: SubmissionSink(get_db()),
+    requires=(get_db,)
+)
+
+# Interactive runs, each in its own process while waiting for input()
+get_sessions = LazyService(
+    'sessions',
+    lambda: SessionManager(get_executor(), on_finish=get_submission_sink().submit),
+    requires=(get_executor, get_submission_sink)
+)
+
+# Pre-serialized lesson responses, built by build_lessons.py when available
+get_lesson_bundle = LazyService(
+    'lesson_bundle',
+    lambda: LessonBundle(
+        get_db().catalog,
+        path=os.path.join(os.path.dirname(__file__), 'data', 'lessons.bundle')
+    ),
+    requires=(get_db,)
+)
+
+# Re-grades stored submissions for instructors, see /api/admin/regrade
+get_batch_grader = LazyService(
+    'batch_grader',
+    lambda: BatchGrader(get_db(), get_executor()),
+    requires=(get_db, get_executor)
+)
+
+# Frontend files in memory, fingerprinted and precompressed by build_assets.py when available
+get_static_assets = LazyService(
+    'static_assets',
+    lambda: StaticAssets(FRONTEND_DIR, build_dir=os.path.join(FRONTEND_DIR, 'dist'))
+)
+
+def shutdown():
+    """Flush pending writes and stop the workers of the services that were started"""
+    for service in (get_submission_sink, get_sessions, get_executor, get_db):
+        if service.created:
+            service().close()
+
+atexit.register(shutdown)
+
+def service_status():
+    """Stats of the started services and the startup breakdown"""
+    return {
+        'submissions': get_submission_sink().stats() if get_submission_sink.created else None,
+        'sessions': get_sessions().stats() if get_sessions.created else None,
+        'grading_cache': get_executor().grading_cache_stats() if get_executor.created else None,
+        'startup_ms': dict(startup_timings)
+    }
+
+REGISTRY.gauge(
+    'submission_queue_depth',
+    'Code submissions waiting to be written',
+    lambda: get_submission_sink().stats()['queue_depth'] if get_submission_sink.created else 0
+)
+REGISTRY.gauge(
+    'interactive_sessions',
+    'Running interactive sessions',
+    lambda: get_sessions().stats()['active'] if get_sessions.created else 0
+)
+
+# Default retention of stored submissions, see /api/admin/retention
+SUBMISSION_RETENTION_DAYS = int(os.environ.get('SUBMISSION_RETENTION_DAYS', 30))
+SUBMISSION_KEEP_LATEST = int(os.environ.get('SUBMISSION_KEEP_LATEST', 20))
+
+USER_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def parse_user_id(user_id):
+    """Check a client supplied user id, falling back to the default user"""
+    return user_id if user_id and USER_ID_PATTERN.match(user_id) else DEFAULT_USER_ID
+
+def current_user_id():
+    """Get the user id sent by the client in X-User-Id"""
+    return parse_user_id(request.headers.get('X-User-Id', ''))
+
+def check_admin():
+    """Check the X-Admin-Token header, returns an error response when it is not valid"""
+    admin_token = os.environ.get('ADMIN_TOKEN', '')
+    if not admin_token:
+        return jsonify({'success': False, 'error': 'Admin API is disabled'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+        return jsonify({'success': False, 'error': 'Invalid admin token'}), 401
+    return None
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def send_packed(packed):
+    """Send a pre-serialized response, answering If-None-Match with 304"""
+    use_gzip = request.accept_encodings['gzip'] > 0
+    etag = packed.etag + '-gz' if use_gzip else packed.etag
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(
+            packed.gzip_body if use_gzip else packed.body,
+            mimetype='application/json'
+        )
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def send_asset(asset):
+    """Send a frontend file in the smallest encoding the client accepts"""
+    encoding = next(
+        (name for name in ('br', 'gzip') if name in asset.bodies and request.accept_encodings[name] > 0),
+        None
+    )
+    etag = f'{asset.etag}-{encoding}' if encoding else asset.etag
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(asset.bodies[encoding], content_type=asset.content_type)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Fingerprinted names change with their content, everything else is revalidated
+    response.headers['Cache-Control'] = (
+        'public, max-age=31536000, immutable' if asset.immutable else 'no-cache'
+    )
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # Streamed responses are recorded when their first byte is ready
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_seconds.observe(
+            time.perf_counter() - start,
+            request.method,
+            route,
+            str(response.status_code)
+        )
+    return response
 
 # ==================== HEALTH CHECK ====================
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'message': 'Python Learning Platform is running!'}), 200
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Python Learning Platform is running!',
+        **service_status()
+    }), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Timing histograms in the Prometheus text format"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/api/test', methods=['GET'])
 def test():
@@ -33,8 +253,12 @@ def test():
 def get_lessons():
     """Get list of all lessons"""
     try:
-        lessons = db.get_all_lessons()
-        progress = db.get_progress()
+        # Progress is served by /api/progress, only include it when asked for
+        if request.args.get('include') != 'progress':
+            return send_packed(get_lesson_bundle().get_index())
+
+        lessons = get_db().get_all_lessons()
+        progress = get_db().get_progress(current_user_id())
         return jsonify({
             'success': True,
             'lessons': lessons,
@@ -43,16 +267,39 @@ def get_lessons():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/lessons/search', methods=['GET'])
+def search_lessons():
+    """Search lessons by title, description, content and example code"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'success': False, 'error': 'No query provided'}), 400
+
+        limit = max(1, min(request.args.get('limit', 20, type=int), 50))
+        return jsonify({
+            'success': True,
+            'query': query,
+            'lessons': get_db().search_lessons(query, limit)
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/lessons/<lesson_id>', methods=['GET'])
 def get_lesson(lesson_id):
     """Get a specific lesson with full content"""
     try:
-        lesson = db.get_lesson(lesson_id)
+        if request.args.get('include') != 'progress':
+            packed = get_lesson_bundle().get_lesson(lesson_id)
+            if not packed:
+                return jsonify({'success': False, 'error': 'Lesson not found'}), 404
+            return send_packed(packed)
+
+        lesson = get_db().get_lesson(lesson_id)
         if not lesson:
             return jsonify({'success': False, 'error': 'Lesson not found'}), 404
 
         # Get progress for this lesson
-        lesson_progress = db.get_lesson_progress(lesson_id)
+        lesson_progress = get_db().get_lesson_progress(lesson_id, current_user_id())
 
         return jsonify({
             'success': True,
@@ -62,12 +309,32 @@ def get_lesson(lesson_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/lessons/<lesson_id>/next', methods=['GET'])
+def get_next_lesson(lesson_id):
+    """Get the lesson to take after a lesson, with its prerequisites and dependents"""
+    try:
+        if not get_db().get_lesson_metadata(lesson_id):
+            return jsonify({'success': False, 'error': 'Lesson not found'}), 404
+
+        # With progress, skip completed lessons and those still missing a prerequisite
+        user_id = current_user_id() if request.args.get('include') == 'progress' else None
+
+        return jsonify({
+            'success': True,
+            'lesson_id': lesson_id,
+            'next': get_db().get_next_lesson(lesson_id, user_id),
+            'prerequisites': get_db().get_prerequisites(lesson_id),
+            'dependents': get_db().get_dependents(lesson_id)
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/lessons/<lesson_id>/complete', methods=['POST'])
 def complete_lesson(lesson_id):
     """Mark a lesson as completed"""
     try:
-        db.mark_lesson_complete(lesson_id)
-        progress = db.get_progress()
+        get_db().mark_lesson_complete(lesson_id, current_user_id())
+        progress = get_db().get_progress(current_user_id())
         return jsonify({
             'success': True,
             'progress': progress
@@ -89,16 +356,17 @@ def execute_code():
             return jsonify({'success': False, 'error': 'No code provided'}), 400
 
         # Execute code
-        result = executor.execute(code)
+        result = get_executor().execute(code)
 
-        # Save submission
+        # Queue submission, it is written in the background
         if lesson_id and exercise_id:
-            db.save_code_submission(
+            get_submission_sink().submit(
                 lesson_id,
                 exercise_id,
                 code,
                 result.get('output', ''),
-                result.get('success', False)
+                result.get('success', False),
+                current_user_id()
             )
 
         return jsonify({
@@ -109,24 +377,74 @@ def execute_code():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/execute/stream', methods=['POST'])
+def execute_code_stream():
+    """Execute Python code, streaming output as Server-Sent Events"""
+    try:
+        data = request.get_json()
+        code = data.get('code', '')
+        lesson_id = data.get('lesson_id', '')
+        exercise_id = data.get('exercise_id', '')
+
+        if not code:
+            return jsonify({'success': False, 'error': 'No code provided'}), 400
+
+        user_id = current_user_id()
+
+        def generate():
+            # Output is only kept when it has to be saved with the submission
+            record = bool(lesson_id and exercise_id)
+            parts = []
+
+            for event, payload in get_executor().execute_stream(code):
+                if event == 'output':
+                    if record:
+                        parts.append(payload)
+                    yield sse_event('output', {'text': payload})
+                    continue
+
+                if record:
+                    parts.append(payload.get('output', ''))
+                    get_submission_sink().submit(
+                        lesson_id,
+                        exercise_id,
+                        code,
+                        ''.join(parts),
+                        payload.get('success', False),
+                        user_id
+                    )
+                yield sse_event('result', payload)
+
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/exercises/<exercise_id>/test', methods=['POST'])
 def test_exercise(exercise_id):
-    """Run code against test cases"""
+    """Run code against the test cases of an exercise"""
     try:
         data = request.get_json()
         code = data.get('code', '')
-        test_cases = data.get('test_cases', [])
-        lesson_id = data.get('lesson_id', '')
+        stop_on_failure = bool(data.get('stop_on_failure', False))
 
         if not code:
             return jsonify({'success': False, 'error': 'No code provided'}), 400
 
+        # Test cases come from the lesson files, never from the client
+        exercise = get_db().get_exercise(exercise_id)
+        if not exercise:
+            return jsonify({'success': False, 'error': 'Exercise not found'}), 404
+
         # Run tests
-        test_result = executor.run_tests(code, test_cases)
+        test_result = get_executor().run_tests(code, exercise['test_cases'], stop_on_failure=stop_on_failure)
 
         # If all tests pass, mark exercise as complete
-        if test_result['success'] and lesson_id:
-            db.mark_exercise_complete(lesson_id, exercise_id)
+        if test_result['success']:
+            get_db().mark_exercise_complete(exercise['lesson_id'], exercise_id, current_user_id())
 
         return jsonify({
             'success': True,
@@ -136,12 +454,148 @@ def test_exercise(exercise_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ==================== INTERACTIVE SESSIONS ====================
+@app.route('/api/sessions', methods=['POST'])
+def start_session():
+    """Start code in an interactive session, returns once it waits for input or ends"""
+    try:
+        data = request.get_json()
+        code = data.get('code', '')
+
+        if not code:
+            return jsonify({'success': False, 'error': 'No code provided'}), 400
+
+        # Runs of an exercise are recorded as a submission once they end
+        return jsonify({
+            'success': True,
+            'session': get_sessions().start(
+                code,
+                data.get('lesson_id'),
+                data.get('exercise_id'),
+                current_user_id()
+            )
+        }), 200
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/sessions/<session_id>/input', methods=['POST'])
+def send_session_input(session_id):
+    """Send a line to input(), returns once the program waits again or ends"""
+    try:
+        data = request.get_json()
+        state = get_sessions().send_input(session_id, data.get('line', ''))
+        if state is None:
+            return jsonify({'success': False, 'error': 'Session not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'session': state
+        }), 200
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def stop_session(session_id):
+    """Stop an interactive session"""
+    try:
+        if not get_sessions().stop(session_id):
+            return jsonify({'success': False, 'error': 'Session not found'}), 404
+        return jsonify({'success': True}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ==================== SUBMISSIONS ====================
+@app.route('/api/submissions', methods=['GET'])
+def get_submission_history():
+    """Get the current user's submissions, newest first, one page per request"""
+    try:
+        cursor = request.args.get('cursor')
+        if cursor is not None and not cursor.isdigit():
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        submissions, next_cursor = get_db().get_submission_history(
+            current_user_id(),
+            exercise_id=request.args.get('exercise_id') or None,
+            before=int(cursor) if cursor is not None else None,
+            limit=limit
+        )
+        return jsonify({
+            'success': True,
+            'submissions': submissions,
+            'next_cursor': str(next_cursor) if next_cursor is not None else None
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/submissions/summary', methods=['GET'])
+def get_submission_summary():
+    """Get the current user's run counts per exercise, including rolled up runs"""
+    try:
+        return jsonify({
+            'success': True,
+            'exercises': get_db().get_submission_summary(current_user_id())
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ==================== ADMIN ====================
+@app.route('/api/admin/retention', methods=['POST'])
+def apply_retention():
+    """Roll old submissions up into per-exercise counts, see Database.apply_retention"""
+    denied = check_admin()
+    if denied:
+        return denied
+
+    try:
+        data = request.get_json(silent=True) or {}
+        stats = get_db().apply_retention(
+            max_age_days=int(data.get('max_age_days', SUBMISSION_RETENTION_DAYS)),
+            keep_latest=int(data.get('keep_latest', SUBMISSION_KEEP_LATEST))
+        )
+        return jsonify({'success': True, 'retention': stats}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/regrade', methods=['POST'])
+def start_regrade():
+    """Re-grade stored submissions of a lesson, an exercise or all of them in the background"""
+    denied = check_admin()
+    if denied:
+        return denied
+
+    try:
+        data = request.get_json(silent=True) or {}
+        if not get_batch_grader().start(data.get('lesson_id') or None, data.get('exercise_id') or None):
+            return jsonify({'success': False, 'error': 'A re-grade is already running'}), 409
+
+        return jsonify({
+            'success': True,
+            'regrade': get_batch_grader().status()
+        }), 202
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/regrade', methods=['GET'])
+def get_regrade_status():
+    """Get the progress of the last re-grade"""
+    denied = check_admin()
+    if denied:
+        return denied
+
+    return jsonify({
+        'success': True,
+        'regrade': get_batch_grader().status()
+    }), 200
+
 # ==================== PROGRESS ====================
 @app.route('/api/progress', methods=['GET'])
 def get_progress():
     """Get user progress"""
     try:
-        progress = db.get_progress()
+        progress = get_db().get_progress(current_user_id())
         return jsonify({
             'success': True,
             'progress': progress
@@ -149,6 +603,31 @@ def get_progress():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/progress/sync', methods=['POST'])
+def sync_progress():
+    """Apply a batch of progress events and get the progress changed since the last sync"""
+    try:
+        data = request.get_json(silent=True) or {}
+        raw_events = data.get('events') or []
+
+        if not isinstance(raw_events, list):
+            return jsonify({'success': False, 'error': 'events must be a list'}), 400
+        if len(raw_events) > MAX_EVENTS:
+            return jsonify({'success': False, 'error': f'At most {MAX_EVENTS} events per sync'}), 400
+
+        user_id = current_user_id()
+        events, rejected = parse_events(raw_events, get_db())
+        result = get_db().sync_progress(events, parse_sync_token(data.get('since')), user_id)
+
+        return jsonify({
+            'success': True,
+            **result,
+            'rejected': rejected,
+            'progress': get_db().get_progress(user_id)
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ==================== FRONTEND SERVING ====================
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -158,9 +637,15 @@ def serve_frontend(path):
     if path.startswith('api/'):
         return jsonify({'error': 'Not found'}), 404
 
-    if path and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    return send_from_directory(app.static_folder, 'index.html')
+    assets = get_static_assets()
+    asset = assets.get('/' + path) if path else None
+    if asset is None:
+        asset = assets.index
+    if asset is None:
+        return jsonify({'error': 'Not found'}), 404
+    return send_asset(asset)
+
+startup_timings['app_import'] = round((time.perf_counter() - _import_start) * 1000, 1)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
@@ -0,0 +1,278 @@
+"""
+ASGI entry point for the Python Learning Platform
+
+Code execution and grading are handled natively and await the worker pool,
+so long-running student code doesn't hold a thread. Every other route is
+passed to the Flask app, which runs on its own thread pool and therefore
+never queues behind executions.
+
+Run with: uvicorn asgi:app --app-dir backend
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+# Add the backend directory to the path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from a2wsgi import WSGIMiddleware
+
+from app import (
+    app as flask_app, get_db, get_executor, get_submission_sink, parse_user_id,
+    service_status, shutdown, sse_event, startup_timings
+)
+from services.metrics import http_request_seconds
+
+# Lesson and progress reads run on these threads
+wsgi_app = WSGIMiddleware(flask_app, workers=int(os.environ.get('WSGI_THREADS', 8)))
+
+EXERCISE_TEST_PATH = re.compile(r'^/api/exercises/([^/]+)/test$')
+
+
+async def read_json(receive):
+    """Read the request body as JSON"""
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    return json.loads(body) if body else None
+
+
+async def send_json(send, payload, status=200):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+
+async def record_submission(*submission):
+    """Queue a submission on a thread, the sink and its lock stay off the event loop"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, lambda: get_submission_sink().submit(*submission))
+
+
+async def health_check(scope, receive, send):
+    await send_json(send, {
+        'status': 'healthy',
+        'message': 'Python Learning Platform is running!',
+        **service_status()
+    })
+
+
+async def execute_code(scope, receive, send):
+    """Execute Python code"""
+    try:
+        data = await read_json(receive) or {}
+        if not isinstance(data, dict):
+            return await send_json(send, {'success': False, 'error': 'Request body must be a JSON object'}, 400)
+
+        code = data.get('code', '')
+        lesson_id = data.get('lesson_id', '')
+        exercise_id = data.get('exercise_id', '')
+
+        if not code:
+            return await send_json(send, {'success': False, 'error': 'No code provided'}, 400)
+
+        result = await get_executor().execute_async(code)
+
+        # Queue submission, it is written in the background
+        if lesson_id and exercise_id:
+            await record_submission(
+                lesson_id,
+                exercise_id,
+                code,
+                result.get('output', ''),
+                result.get('success', False),
+                parse_user_id(header(scope, b'x-user-id'))
+            )
+
+        await send_json(send, {'success': True, 'execution': result})
+
+    except Exception as e:
+        await send_json(send, {'success': False, 'error': str(e)}, 500)
+
+
+async def execute_code_stream(scope, receive, send):
+    """Execute Python code, streaming output as Server-Sent Events"""
+    try:
+        data = await read_json(receive) or {}
+        if not isinstance(data, dict):
+            return await send_json(send, {'success': False, 'error': 'Request body must be a JSON object'}, 400)
+
+        code = data.get('code', '')
+        lesson_id = data.get('lesson_id', '')
+        exercise_id = data.get('exercise_id', '')
+    except Exception as e:
+        return await send_json(send, {'success': False, 'error': str(e)}, 500)
+
+    if not code:
+        return await send_json(send, {'success': False, 'error': 'No code provided'}, 400)
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            (b'access-control-allow-origin', b'*'),
+        ]
+    })
+
+    # Output is only kept when it has to be saved with the submission
+    record = bool(lesson_id and exercise_id)
+    parts = []
+
+    # send() waits while the client is slow to read, which in turn holds the worker
+    async for event, payload in get_executor().execute_stream_async(code):
+        if event == 'output':
+            if record:
+                parts.append(payload)
+            payload = {'text': payload}
+        elif record:
+            parts.append(payload.get('output', ''))
+            await record_submission(
+                lesson_id,
+                exercise_id,
+                code,
+                ''.join(parts),
+                payload.get('success', False),
+                parse_user_id(header(scope, b'x-user-id'))
+            )
+
+        await send({
+            'type': 'http.response.body',
+            'body': sse_event(event, payload).encode('utf-8'),
+            'more_body': True
+        })
+
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def test_exercise(scope, receive, send, exercise_id):
+    """Run code against the test cases of an exercise"""
+    try:
+        data = await read_json(receive) or {}
+        if not isinstance(data, dict):
+            return await send_json(send, {'success': False, 'error': 'Request body must be a JSON object'}, 400)
+
+        code = data.get('code', '')
+        stop_on_failure = bool(data.get('stop_on_failure', False))
+
+        if not code:
+            return await send_json(send, {'success': False, 'error': 'No code provided'}, 400)
+
+        # Test cases come from the lesson files, never from the client
+        exercise = get_db().get_exercise(exercise_id)
+        if not exercise:
+            return await send_json(send, {'success': False, 'error': 'Exercise not found'}, 404)
+
+        test_result = await get_executor().run_tests_async(
+            code,
+            exercise['test_cases'],
+            stop_on_failure=stop_on_failure
+        )
+
+        # If all tests pass, mark exercise as complete
+        if test_result['success']:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                None,
+                get_db().mark_exercise_complete,
+                exercise['lesson_id'],
+                exercise_id,
+                parse_user_id(header(scope, b'x-user-id'))
+            )
+
+        await send_json(send, {'success': True, 'test_result': test_result})
+
+    except Exception as e:
+        await send_json(send, {'success': False, 'error': str(e)}, 500)
+
+
+async def lifespan(scope, receive, send):
+    """Start the services the native handlers use, flush pending writes and stop workers once the server has drained"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Migrations and forking the workers block, so they run on a thread
+            # before the first request instead of on the event loop inside it
+            loop = asyncio.get_running_loop()
+            for service in (get_db, get_executor, get_submission_sink):
+                await loop.run_in_executor(None, service)
+            print(f"Startup (ms): {startup_timings}")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def timed(route, handler, scope, receive, send, *args):
+    """Run a native handler, recording its time like the Flask routes"""
+    status = []
+
+    async def send_with_status(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        await send(message)
+
+    start = time.perf_counter()
+    try:
+        await handler(scope, receive, send_with_status, *args)
+    finally:
+        http_request_seconds.observe(
+            time.perf_counter() - start,
+            scope['method'],
+            route,
+            str(status[0] if status else 500)
+        )
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(scope, receive, send)
+
+    if scope['type'] == 'http':
+        path = scope['path']
+        method = scope['method']
+
+        if method == 'GET' and path == '/api/health':
+            return await timed(path, health_check, scope, receive, send)
+
+        if method == 'POST':
+            if path == '/api/execute':
+                return await timed(path, execute_code, scope, receive, send)
+
+            if path == '/api/execute/stream':
+                return await timed(path, execute_code_stream, scope, receive, send)
+
+            match = EXERCISE_TEST_PATH.match(path)
+            if match:
+                return await timed(
+                    '/api/exercises/<exercise_id>/test',
+                    test_exercise, scope, receive, send, match.group(1)
+                )
+
+    await wsgi_app(scope, receive, send)
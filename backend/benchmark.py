@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+"""
+Benchmark the API with a realistic traffic mix
+Replays lesson browsing, code execution with lesson examples, grading and
+progress writes against the app in-process or a running server, and reports
+throughput and p50/p95/p99 latency per endpoint
+
+Examples:
+    python backend/benchmark.py --requests 2000 --concurrency 8 --output before.json
+    python backend/benchmark.py --url http://localhost:5001 --compare before.json
+"""
+
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+# Add the backend directory to the path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from services.lesson_catalog import LessonCatalog
+
+LESSONS_DIR = os.path.join(backend_dir, 'data', 'lessons')
+
+# Share of each kind of request, roughly what a class working through lessons sends
+TRAFFIC_MIX = {
+    'list_lessons': 15,
+    'get_lesson': 35,
+    'execute': 25,
+    'grade': 12,
+    'complete_lesson': 5,
+    'progress': 8,
+}
+
+
+def load_samples():
+    """Collect lesson ids, example programs and exercises from the lesson files"""
+    catalog = LessonCatalog(LESSONS_DIR, poll_interval=0)
+    lesson_ids = [lesson['id'] for lesson in catalog.get_all_lessons()]
+    examples = []
+    exercises = []
+
+    for lesson_id in lesson_ids:
+        for section in catalog.get_lesson(lesson_id).get('sections', []):
+            for example in section.get('examples', []):
+                if example.get('code'):
+                    examples.append(example['code'])
+            exercise = section.get('exercise')
+            if exercise and exercise.get('id'):
+                exercises.append((lesson_id, exercise['id'], exercise.get('starter_code', '')))
+
+    catalog.close()
+    return lesson_ids, examples, exercises
+
+
+def build_requests(count, seed):
+    """
+    Build the request sequence up front so every run replays the same traffic
+
+    Returns:
+        List of (endpoint name, method, path, JSON body or None, user id)
+    """
+    rng = random.Random(seed)
+    lesson_ids, examples, exercises = load_samples()
+    names = list(TRAFFIC_MIX)
+    weights = [TRAFFIC_MIX[name] for name in names]
+    users = [f'bench-user-{i}' for i in range(50)]
+
+    plan = []
+    for name in rng.choices(names, weights, k=count):
+        user_id = rng.choice(users)
+        if name == 'list_lessons':
+            plan.append((name, 'GET', '/api/lessons', None, user_id))
+        elif name == 'get_lesson':
+            plan.append((name, 'GET', f'/api/lessons/{rng.choice(lesson_ids)}', None, user_id))
+        elif name == 'execute':
+            lesson_id, exercise_id, _ = rng.choice(exercises)
+            plan.append((name, 'POST', '/api/execute', {
+                'code': rng.choice(examples),
+                'lesson_id': lesson_id,
+                'exercise_id': exercise_id
+            }, user_id))
+        elif name == 'grade':
+            lesson_id, exercise_id, starter_code = rng.choice(exercises)
+            plan.append((name, 'POST', f'/api/exercises/{exercise_id}/test', {
+                'code': starter_code or 'print()'
+            }, user_id))
+        elif name == 'complete_lesson':
+            plan.append((name, 'POST', f'/api/lessons/{rng.choice(lesson_ids)}/complete', None, user_id))
+        else:
+            plan.append((name, 'GET', '/api/progress', None, user_id))
+    return plan
+
+
+class InProcessClient:
+    """Sends requests to the Flask app through its test client"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body, user_id):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers={'X-User-Id': user_id})
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    """Sends requests to a running server"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body, user_id):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header('X-User-Id', user_id)
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, seconds):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / seconds if seconds else 0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] * 1000) if latencies else 0
+    }
+
+
+def run(client, plan, concurrency):
+    """Send the planned requests from concurrency threads, timing each one"""
+    latencies = {}
+    errors = {}
+    lock = threading.Lock()
+    position = [0]
+
+    def worker():
+        while True:
+            with lock:
+                if position[0] >= len(plan):
+                    return
+                name, method, path, body, user_id = plan[position[0]]
+                position[0] += 1
+
+            start = time.perf_counter()
+            try:
+                status = client.request(method, path, body, user_id)
+            except Exception as e:
+                print(f"Error sending {method} {path}: {e}")
+                status = 0
+            elapsed = time.perf_counter() - start
+
+            with lock:
+                latencies.setdefault(name, []).append(elapsed)
+                if not 200 <= status < 400:
+                    errors[name] = errors.get(name, 0) + 1
+
+    start_time = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start_time
+
+    endpoints = {
+        name: summarize(values, errors.get(name, 0), seconds)
+        for name, values in sorted(latencies.items())
+    }
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        'seconds': seconds,
+        'total': summarize(all_latencies, sum(errors.values()), seconds),
+        'endpoints': endpoints
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=backend_dir, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def print_report(results, baseline=None):
+    header = f"{'endpoint':<18}{'requests':>9}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('─' * len(header))
+
+    rows = list(results['endpoints'].items()) + [('TOTAL', results['total'])]
+    for name, stats in rows:
+        line = (f"{name:<18}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput']:>10.1f}"
+                f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+        if baseline:
+            before = baseline['total'] if name == 'TOTAL' else baseline['endpoints'].get(name)
+            if before and before['p95_ms']:
+                change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+                line += f"   p95 {change:+.1f}%"
+        print(line)
+
+
+def main():
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description='Benchmark the API with a realistic traffic mix')
+    parser.add_argument('--url', help='benchmark a running server instead of the app in-process')
+    parser.add_argument('--requests', type=int, default=1000, help='number of requests (default: 1000)')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients (default: 8)')
+    parser.add_argument('--warmup', type=int, default=50, help='requests sent before measuring')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the traffic mix')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='results JSON of an earlier run to compare with')
+    args = parser.parse_args()
+
+    plan = build_requests(args.warmup + args.requests, args.seed)
+
+    if args.url:
+        client = HttpClient(args.url)
+        target = args.url
+    else:
+        # A throwaway database, the benchmark must not write into the real one
+        temp_dir = tempfile.TemporaryDirectory()
+        # Registered first so it runs after the app's shutdown hooks
+        atexit.register(temp_dir.cleanup)
+        os.environ['DATABASE_PATH'] = os.path.join(temp_dir.name, 'benchmark.db')
+        from app import app
+        client = InProcessClient(app)
+        target = 'in-process'
+
+    print(f"Benchmarking {target}: {args.requests} requests, {args.concurrency} clients\n")
+
+    if args.warmup:
+        run(client, plan[:args.warmup], args.concurrency)
+    results = run(client, plan[args.warmup:], args.concurrency)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'target': target,
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'seed': args.seed,
+                'traffic_mix': TRAFFIC_MIX,
+                'results': results
+            }, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Build the frontend for production
+Copies the frontend into frontend/dist with content hashes in the file names,
+precompresses every file with gzip (and brotli when installed), points
+index.html at the hashed names and writes the manifest StaticAssets loads
+"""
+
+import json
+import os
+import re
+import shutil
+import sys
+
+# Add the backend directory to the path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from services.static_assets import (
+    ENCODING_SUFFIXES, MANIFEST_NAME, MANIFEST_VERSION, brotli, compress, etag
+)
+
+FRONTEND_DIR = os.path.join(os.path.dirname(backend_dir), 'frontend')
+DIST_DIR = os.path.join(FRONTEND_DIR, 'dist')
+
+# Pages keep their name, browsers revalidate them and get the new asset names
+PAGES = ('/index.html',)
+
+# Local references in src and href attributes
+REFERENCE = re.compile(r'''((?:src|href)=["'])(/[^"'?#]+)''')
+
+
+def fingerprint(url_path, body):
+    """css/main.css -> css/main.<hash>.css"""
+    stem, extension = os.path.splitext(url_path)
+    return f'{stem}.{etag(body)[:10]}{extension}'
+
+
+def read_sources():
+    """URL path -> contents of every source file"""
+    sources = {}
+    for root, dirs, files in os.walk(FRONTEND_DIR):
+        dirs[:] = [name for name in dirs if not os.path.join(root, name).startswith(DIST_DIR)]
+        for name in files:
+            file_path = os.path.join(root, name)
+            url_path = '/' + os.path.relpath(file_path, FRONTEND_DIR).replace(os.sep, '/')
+            with open(file_path, 'rb') as f:
+                sources[url_path] = f.read()
+    return sources
+
+
+def write_file(build_dir, url_path, body, immutable):
+    """Write a file and its compressed variants, returning its manifest entry"""
+    file_path = os.path.join(build_dir, *url_path.lstrip('/').split('/'))
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    with open(file_path, 'wb') as f:
+        f.write(body)
+
+    variants = compress(body, url_path)
+    for encoding, data in variants.items():
+        with open(file_path + ENCODING_SUFFIXES[encoding], 'wb') as f:
+            f.write(data)
+
+    return {
+        'etag': etag(body),
+        'immutable': immutable,
+        'encodings': sorted(variants),
+        'size': len(body),
+        'compressed_size': min([len(data) for data in variants.values()] or [len(body)])
+    }
+
+
+def build(dist_dir=DIST_DIR):
+    """
+    Build the frontend into dist_dir, replacing an earlier build
+
+    Returns:
+        The manifest
+    """
+    sources = read_sources()
+    renamed = {
+        url_path: fingerprint(url_path, body)
+        for url_path, body in sources.items() if url_path not in PAGES
+    }
+    manifest = {'version': MANIFEST_VERSION, 'assets': renamed, 'files': {}}
+
+    # Built next to the old build and swapped in, a half-written build is never served
+    build_dir = dist_dir + '.tmp'
+    shutil.rmtree(build_dir, ignore_errors=True)
+
+    for url_path, body in sorted(sources.items()):
+        if url_path in PAGES:
+            html = REFERENCE.sub(
+                lambda match: match.group(1) + renamed.get(match.group(2), match.group(2)),
+                body.decode('utf-8')
+            )
+            manifest['files'][url_path] = write_file(build_dir, url_path, html.encode('utf-8'), False)
+        else:
+            manifest['files'][renamed[url_path]] = write_file(build_dir, renamed[url_path], body, True)
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    shutil.rmtree(dist_dir, ignore_errors=True)
+    os.replace(build_dir, dist_dir)
+    return manifest
+
+
+def main():
+    """Build the frontend"""
+    dist_dir = sys.argv[1] if len(sys.argv) > 1 else DIST_DIR
+    manifest = build(dist_dir)
+
+    files = manifest['files'].values()
+    size = sum(entry['size'] for entry in files)
+    compressed_size = sum(entry['compressed_size'] for entry in files)
+    print(f"✓ {len(manifest['files'])} files built into {dist_dir} "
+          f"({size} bytes, {compressed_size} compressed with {'brotli' if brotli else 'gzip'})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""
+Build the precompiled lesson bundle
+Packs all lesson files into one file with pre-serialized, pre-gzipped responses
+"""
+
+import os
+import sys
+
+# Add the backend directory to the path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from services.lesson_bundle import LessonBundle
+from services.lesson_catalog import LessonCatalog
+
+LESSONS_DIR = os.path.join(backend_dir, 'data', 'lessons')
+BUNDLE_PATH = os.path.join(backend_dir, 'data', 'lessons.bundle')
+
+
+def main():
+    """Build the bundle"""
+    bundle_path = sys.argv[1] if len(sys.argv) > 1 else BUNDLE_PATH
+
+    catalog = LessonCatalog(LESSONS_DIR, poll_interval=0)
+    bundle = LessonBundle(catalog)
+    bundle.pack_all()
+    bundle.write(bundle_path)
+
+    print(f"✓ {len(catalog)} lessons packed into {bundle_path} ({os.path.getsize(bundle_path)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
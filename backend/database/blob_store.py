@@ -0,0 +1,77 @@
+import hashlib
+import zlib
+
+# zlib level for stored blobs, small texts gain little from higher levels
+COMPRESS_LEVEL = 6
+
+
+class BlobStore:
+    """Content-addressed text storage in the blobs table
+
+    Every distinct text is stored once, compressed with zlib, and referenced
+    by its row id. Texts are identified by the SHA-256 of their UTF-8 bytes,
+    so storing a text that is already there only costs an index lookup.
+    Methods take the connection of the caller's transaction.
+    """
+
+    def put(self, conn, text, known=None):
+        """
+        Store a text unless it is stored already
+
+        Args:
+            conn: Connection inside a write transaction
+            text: Text to store
+            known: Optional dictionary of digest -> blob id shared by the
+                calls of one transaction, saves the lookups of repeated texts
+
+        Returns:
+            Blob id
+        """
+        # Lone surrogates, from JSON escapes like "\ud800", are kept as they are
+        data = text.encode('utf-8', 'surrogatepass')
+        digest = hashlib.sha256(data).digest()
+
+        if known is not None and digest in known:
+            return known[digest]
+
+        row = conn.execute('SELECT id FROM blobs WHERE hash = ?', (digest,)).fetchone()
+        if row:
+            blob_id = row[0]
+        else:
+            blob_id = conn.execute(
+                'INSERT INTO blobs (hash, data, size) VALUES (?, ?, ?)',
+                (digest, zlib.compress(data, COMPRESS_LEVEL), len(data))
+            ).lastrowid
+
+        if known is not None:
+            known[digest] = blob_id
+        return blob_id
+
+    def get_many(self, conn, blob_ids):
+        """
+        Read texts by blob id
+
+        Returns:
+            Dictionary of blob id -> text, ids that don't exist are left out
+        """
+        texts = {}
+        ids = list({blob_id for blob_id in blob_ids if blob_id is not None})
+
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = conn.execute(
+                f"SELECT id, data FROM blobs WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            for blob_id, data in rows:
+                texts[blob_id] = zlib.decompress(data).decode('utf-8', 'surrogatepass')
+        return texts
+
+    def delete_unreferenced(self, conn):
+        """Delete blobs no submission refers to, returns the number deleted"""
+        return conn.execute('''
+            DELETE FROM blobs
+            WHERE id NOT IN (SELECT code_blob FROM code_submissions)
+              AND id NOT IN (SELECT output_blob FROM code_submissions WHERE output_blob IS NOT NULL)
+        ''').rowcount
@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from services.metrics import db_commit_seconds
+
+
+class ConnectionManager:
+    """Per-thread SQLite connections, opened once in WAL mode and reused
+
+    Each server thread keeps its own connection, so the statement cache of
+    the connection is reused across requests and no connection is shared
+    between threads.
+    """
+
+    PRAGMAS = (
+        'PRAGMA journal_mode=WAL',      # readers don't block the writer
+        'PRAGMA synchronous=NORMAL',    # fsync on checkpoint instead of every commit
+        'PRAGMA busy_timeout=5000',     # wait for the write lock instead of failing
+        'PRAGMA cache_size=-16000',     # 16 MB page cache per connection
+        'PRAGMA temp_store=MEMORY',
+    )
+
+    def __init__(self, db_path, cached_statements=256):
+        """
+        Initialize connection manager
+
+        Args:
+            db_path: Path of the SQLite database file
+            cached_statements: Number of prepared statements kept per connection
+        """
+        self.db_path = db_path
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _open(self):
+        # Autocommit mode, transactions are started explicitly by transaction()
+        conn = sqlite3.connect(
+            self.db_path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self):
+        """Get the connection of the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run statements in a single write transaction
+
+        Commits when the block exits normally and rolls back on error.
+        Nested blocks join the outer transaction.
+        """
+        conn = self.connection()
+
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.depth = 1
+        try:
+            yield conn
+            with db_commit_seconds.time():
+                conn.execute('COMMIT')
+        except BaseException:
+            # Also after a failed COMMIT, the thread's connection is reused and
+            # must not stay inside the transaction. SQLite may have rolled back
+            # on its own already.
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            self._local.depth = 0
+
+    def close_all(self):
+        """Close the connections of all threads"""
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+        self._local = threading.local()
@@ -1,9 +1,18 @@
-import json
 import os
-import sqlite3
 from datetime import datetime
 
+from database.blob_store import BlobStore
+from database.connection import ConnectionManager
+from services.metrics import db_query_seconds
+from services.lesson_catalog import LessonCatalog
+
+# Progress recorded before users were tracked belongs to this user
+DEFAULT_USER_ID = 'default'
+
 class Database:
+    # Schema version stored in PRAGMA user_version, see the _migrate_vN methods
+    SCHEMA_VERSION = 6
+
     def __init__(self, db_path=None):
         # Get the directory of the current file and work from there
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,11 +28,44 @@ class Database:
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         os.makedirs(self.lessons_dir, exist_ok=True)
 
+        # One reusable WAL-mode connection per server thread
+        self.connections = ConnectionManager(self.db_path)
+
+        # Submission code and output, stored once per distinct text
+        self.blobs = BlobStore()
+
         self.init_database()
 
+        # Lessons are served from memory, files are only re-read when they change
+        self.catalog = LessonCatalog(self.lessons_dir)
+
     def init_database(self):
-        """Initialize database with required tables"""
-        conn = sqlite3.connect(self.db_path)
+        """Initialize database tables, applying schema migrations if needed"""
+        if self._schema_version(self.connections.connection()) >= self.SCHEMA_VERSION:
+            return
+
+        with self.connections.transaction() as conn:
+            # Another process may have migrated while we waited for the write lock
+            version = self._schema_version(conn)
+            for target in range(version + 1, self.SCHEMA_VERSION + 1):
+                getattr(self, f'_migrate_v{target}')(conn)
+                conn.execute(f'PRAGMA user_version = {target}')
+
+        # Migrations rebuild tables, give the freed pages back
+        self.compact()
+
+    def _schema_version(self, conn):
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def _add_missing_columns(self, conn, table, columns):
+        """Add columns that databases created by older versions don't have"""
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        for name, definition in columns:
+            if name not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+    def _migrate_v1(self, conn):
+        """Base tables"""
         cursor = conn.cursor()
 
         # User progress table
@@ -52,153 +94,750 @@ class Database:
             )
         ''')
 
-        conn.commit()
-        conn.close()
+        self._add_missing_columns(conn, 'user_progress', [
+            ('completed', 'BOOLEAN DEFAULT FALSE'),
+            ('last_code', 'TEXT'),
+            ('test_passed', 'BOOLEAN DEFAULT FALSE'),
+            ('completed_at', 'TIMESTAMP'),
+        ])
+        self._add_missing_columns(conn, 'code_submissions', [
+            ('lesson_id', "TEXT NOT NULL DEFAULT ''"),
+            ('output', 'TEXT'),
+            ('success', 'BOOLEAN'),
+        ])
+
+    def _migrate_v2(self, conn):
+        """One row per (lesson_id, exercise_id) and indexes for the progress queries"""
+        cursor = conn.cursor()
+
+        # Lesson completions use '' as exercise_id, NULLs would never conflict
+        cursor.execute('''
+            CREATE TABLE user_progress_v2 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                lesson_id TEXT NOT NULL,
+                exercise_id TEXT NOT NULL DEFAULT '',
+                completed BOOLEAN DEFAULT FALSE,
+                last_code TEXT,
+                test_passed BOOLEAN DEFAULT FALSE,
+                completed_at TIMESTAMP,
+                UNIQUE (lesson_id, exercise_id)
+            )
+        ''')
+
+        # Compact the duplicate rows written by INSERT OR REPLACE, keeping the
+        # code of the latest row that has code
+        cursor.execute('''
+            INSERT INTO user_progress_v2 (lesson_id, exercise_id, completed, last_code, test_passed, completed_at)
+            SELECT lesson_id,
+                   exercise_id,
+                   MAX(COALESCE(completed, FALSE)),
+                   MAX(CASE WHEN code_rank = 1 THEN last_code END),
+                   MAX(COALESCE(test_passed, FALSE)),
+                   MAX(completed_at)
+            FROM (
+                SELECT lesson_id,
+                       COALESCE(exercise_id, '') AS exercise_id,
+                       completed,
+                       last_code,
+                       test_passed,
+                       completed_at,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY lesson_id, COALESCE(exercise_id, '')
+                           ORDER BY last_code IS NULL, completed_at DESC, id DESC
+                       ) AS code_rank
+                FROM user_progress
+            )
+            GROUP BY lesson_id, exercise_id
+        ''')
+
+        cursor.execute('DROP TABLE user_progress')
+        cursor.execute('ALTER TABLE user_progress_v2 RENAME TO user_progress')
+
+        # Covering indexes: completed lesson count and latest completion,
+        # passed exercises per lesson
+        cursor.execute('''
+            CREATE INDEX idx_user_progress_completed
+            ON user_progress (completed, completed_at, lesson_id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX idx_user_progress_passed
+            ON user_progress (lesson_id, test_passed)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_code_submissions_exercise
+            ON code_submissions (lesson_id, exercise_id)
+        ''')
+
+    def _migrate_v3(self, conn):
+        """Progress keyed by user, with per-user aggregates maintained on write"""
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE user_progress_v3 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                lesson_id TEXT NOT NULL,
+                exercise_id TEXT NOT NULL DEFAULT '',
+                completed BOOLEAN DEFAULT FALSE,
+                last_code TEXT,
+                test_passed BOOLEAN DEFAULT FALSE,
+                completed_at TIMESTAMP,
+                UNIQUE (user_id, lesson_id, exercise_id)
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO user_progress_v3
+                (user_id, lesson_id, exercise_id, completed, last_code, test_passed, completed_at)
+            SELECT ?, lesson_id, exercise_id, completed, last_code, test_passed, completed_at
+            FROM user_progress
+        ''', (DEFAULT_USER_ID,))
+        cursor.execute('DROP TABLE user_progress')
+        cursor.execute('ALTER TABLE user_progress_v3 RENAME TO user_progress')
+
+        self._add_missing_columns(conn, 'code_submissions', [
+            ('user_id', f"TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}'"),
+        ])
+        cursor.execute('DROP INDEX IF EXISTS idx_code_submissions_exercise')
+        cursor.execute('''
+            CREATE INDEX idx_code_submissions_exercise
+            ON code_submissions (user_id, lesson_id, exercise_id)
+        ''')
+
+        # One row per user: read by /api/progress with a single primary key lookup
+        cursor.execute('''
+            CREATE TABLE user_stats (
+                user_id TEXT PRIMARY KEY,
+                completed_count INTEGER NOT NULL DEFAULT 0,
+                last_completed_lesson_id TEXT,
+                updated_at TIMESTAMP
+            ) WITHOUT ROWID
+        ''')
+
+        # One row per user and lesson
+        cursor.execute('''
+            CREATE TABLE user_lesson_stats (
+                user_id TEXT NOT NULL,
+                lesson_id TEXT NOT NULL,
+                completed BOOLEAN NOT NULL DEFAULT FALSE,
+                passed_exercises INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, lesson_id)
+            ) WITHOUT ROWID
+        ''')
+
+        # Backfill the aggregates from existing progress
+        cursor.execute('''
+            INSERT INTO user_lesson_stats (user_id, lesson_id, completed, passed_exercises)
+            SELECT user_id,
+                   lesson_id,
+                   MAX(exercise_id = '' AND completed),
+                   SUM(exercise_id != '' AND test_passed)
+            FROM user_progress
+            GROUP BY user_id, lesson_id
+        ''')
+        cursor.execute('''
+            INSERT INTO user_stats (user_id, completed_count, last_completed_lesson_id, updated_at)
+            SELECT user_id,
+                   SUM(completed),
+                   (SELECT p.lesson_id FROM user_progress p
+                    WHERE p.user_id = s.user_id AND p.exercise_id = '' AND p.completed
+                    ORDER BY p.completed_at DESC LIMIT 1),
+                   CURRENT_TIMESTAMP
+            FROM user_lesson_stats s
+            GROUP BY user_id
+        ''')
+
+    def _migrate_v4(self, conn):
+        """Grades written by the batch grader, one row per submission"""
+        conn.execute('''
+            CREATE TABLE submission_grades (
+                submission_id INTEGER PRIMARY KEY,
+                exercise_id TEXT NOT NULL,
+                passed BOOLEAN NOT NULL,
+                passed_cases INTEGER NOT NULL,
+                total_cases INTEGER NOT NULL,
+                graded_at TIMESTAMP
+            )
+        ''')
+
+    def _migrate_v5(self, conn):
+        """Progress events applied by /api/progress/sync and change stamps for sync deltas"""
+        # Ids of applied events, so a retried upload is not applied twice
+        conn.execute('''
+            CREATE TABLE progress_events (
+                user_id TEXT NOT NULL,
+                event_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                lesson_id TEXT NOT NULL,
+                exercise_id TEXT NOT NULL DEFAULT '',
+                occurred_at TIMESTAMP,
+                received_at TIMESTAMP,
+                PRIMARY KEY (user_id, event_id)
+            ) WITHOUT ROWID
+        ''')
+
+        # sync_seq counts the changes of a user, a lesson row keeps the count of its last change
+        self._add_missing_columns(conn, 'user_stats', [
+            ('sync_seq', 'INTEGER NOT NULL DEFAULT 0'),
+            ('last_completed_at', 'TIMESTAMP'),
+        ])
+        self._add_missing_columns(conn, 'user_lesson_stats', [
+            ('changed_seq', 'INTEGER NOT NULL DEFAULT 0'),
+        ])
+        conn.execute('UPDATE user_stats SET last_completed_at = updated_at')
+
+    def _migrate_v6(self, conn):
+        """Submission code and output in deduplicated, compressed blobs, and rollups of old runs"""
+        conn.execute('''
+            CREATE TABLE blobs (
+                id INTEGER PRIMARY KEY,
+                hash BLOB NOT NULL UNIQUE,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL
+            )
+        ''')
+        conn.execute(f'''
+            CREATE TABLE code_submissions_v6 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}',
+                lesson_id TEXT NOT NULL,
+                exercise_id TEXT NOT NULL,
+                code_blob INTEGER NOT NULL,
+                output_blob INTEGER,
+                success BOOLEAN,
+                submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Copied in batches with their ids, so submission_grades still match
+        known = {}
+        last_id = 0
+        while True:
+            rows = conn.execute('''
+                SELECT id, user_id, lesson_id, exercise_id, code, output, success, submitted_at
+                FROM code_submissions WHERE id > ? ORDER BY id LIMIT 1000
+            ''', (last_id,)).fetchall()
+            if not rows:
+                break
+
+            conn.executemany('''
+                INSERT INTO code_submissions_v6
+                    (id, user_id, lesson_id, exercise_id, code_blob, output_blob, success, submitted_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (submission_id, user_id, lesson_id, exercise_id,
+                 self.blobs.put(conn, code, known),
+                 self.blobs.put(conn, output, known) if output is not None else None,
+                 success, submitted_at)
+                for submission_id, user_id, lesson_id, exercise_id, code, output, success, submitted_at in rows
+            ])
+            last_id = rows[-1][0]
+
+        conn.execute('DROP TABLE code_submissions')
+        conn.execute('ALTER TABLE code_submissions_v6 RENAME TO code_submissions')
+
+        # History pages of a user, all submissions or those of one exercise
+        conn.execute('CREATE INDEX idx_code_submissions_user ON code_submissions (user_id, id)')
+        conn.execute('''
+            CREATE INDEX idx_code_submissions_exercise
+            ON code_submissions (user_id, exercise_id, id)
+        ''')
+
+        # Runs removed by apply_retention, counted per user and exercise
+        conn.execute('''
+            CREATE TABLE submission_rollups (
+                user_id TEXT NOT NULL,
+                lesson_id TEXT NOT NULL,
+                exercise_id TEXT NOT NULL,
+                runs INTEGER NOT NULL,
+                successes INTEGER NOT NULL,
+                first_at TIMESTAMP,
+                last_at TIMESTAMP,
+                PRIMARY KEY (user_id, lesson_id, exercise_id)
+            ) WITHOUT ROWID
+        ''')
+
+    def compact(self):
+        """Reclaim space left by deleted rows and refresh query planner statistics"""
+        conn = self.connections.connection()
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('PRAGMA optimize')
 
     def get_all_lessons(self):
-        """Get list of all lessons from JSON files"""
-        lessons = []
-
-        if not os.path.exists(self.lessons_dir):
-            return lessons
-
-        # Load all lesson JSON files
-        lesson_files = sorted([f for f in os.listdir(self.lessons_dir) if f.endswith('.json')])
-
-        for filename in lesson_files:
-            lesson_file = os.path.join(self.lessons_dir, filename)
-            try:
-                with open(lesson_file, 'r', encoding='utf-8') as f:
-                    lesson_json = json.load(f)
-                    lessons.append({
-                        'id': lesson_json.get('id'),
-                        'title': lesson_json.get('title'),
-                        'order': lesson_json.get('order', 0),
-                        'description': lesson_json.get('description', ''),
-                        'week': lesson_json.get('week', 0)
-                    })
-            except Exception as e:
-                print(f"Error loading lesson file {filename}: {e}")
-
-        # Sort by order
-        lessons.sort(key=lambda x: x['order'])
-        return lessons
+        """Get list of all lessons"""
+        return self.catalog.get_all_lessons()
 
     def get_lesson(self, lesson_id):
-        """Get a specific lesson with full content from JSON file"""
-        lesson_file = os.path.join(self.lessons_dir, f'{lesson_id}.json')
+        """Get a specific lesson with full content"""
+        return self.catalog.get_lesson(lesson_id)
 
-        if os.path.exists(lesson_file):
-            try:
-                with open(lesson_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"Error loading lesson {lesson_id}: {e}")
-                return None
+    def get_lesson_metadata(self, lesson_id):
+        """Get lesson metadata"""
+        return self.catalog.get_lesson_metadata(lesson_id)
 
-        return None
+    def get_exercise(self, exercise_id):
+        """Get an exercise with its test cases"""
+        return self.catalog.get_exercise(exercise_id)
 
-    def get_lesson_metadata(self, lesson_id):
-        """Get lesson metadata from JSON file"""
-        lesson_file = os.path.join(self.lessons_dir, f'{lesson_id}.json')
-
-        if os.path.exists(lesson_file):
-            try:
-                with open(lesson_file, 'r', encoding='utf-8') as f:
-                    lesson_json = json.load(f)
-                    return {
-                        'id': lesson_json.get('id'),
-                        'title': lesson_json.get('title'),
-                        'order': lesson_json.get('order'),
-                        'description': lesson_json.get('description', ''),
-                        'week': lesson_json.get('week', 0)
-                    }
-            except Exception as e:
-                print(f"Error loading lesson metadata {lesson_id}: {e}")
-
-        return None
-
-    def mark_lesson_complete(self, lesson_id):
+    def search_lessons(self, query, limit=20):
+        """Search lessons, see LessonCatalog.search"""
+        return self.catalog.search(query, limit)
+
+    @db_query_seconds.time('get_completed_lesson_ids')
+    def get_completed_lesson_ids(self, user_id=DEFAULT_USER_ID):
+        """Get the set of lessons a user completed"""
+        try:
+            rows = self.connections.connection().execute('''
+                SELECT lesson_id FROM user_lesson_stats WHERE user_id = ? AND completed
+            ''', (user_id,)).fetchall()
+            return {row[0] for row in rows}
+        except Exception as e:
+            print(f"Error getting completed lessons: {e}")
+            return set()
+
+    def get_prerequisites(self, lesson_id):
+        """Get metadata of the lessons a lesson directly requires"""
+        return [self.catalog.get_lesson_metadata(i) for i in self.catalog.get_prerequisites(lesson_id)]
+
+    def get_dependents(self, lesson_id):
+        """Get metadata of the lessons directly requiring a lesson"""
+        return [self.catalog.get_lesson_metadata(i) for i in self.catalog.get_dependents(lesson_id)]
+
+    def get_next_lesson(self, lesson_id, user_id=None):
+        """
+        Get metadata of the lesson to take after a lesson
+
+        Args:
+            lesson_id: Current lesson
+            user_id: If given, skip lessons the user completed or can't start yet
+
+        Returns:
+            Lesson metadata, None if there is no next lesson
+        """
+        completed = self.get_completed_lesson_ids(user_id) if user_id is not None else None
+        next_id = self.catalog.get_next_lesson(lesson_id, completed)
+        return self.catalog.get_lesson_metadata(next_id) if next_id else None
+
+    def _complete_lesson(self, conn, user_id, lesson_id, completed_at):
+        """Record a lesson completion, returns True the first time the lesson is completed"""
+        conn.execute('''
+            INSERT INTO user_progress (user_id, lesson_id, exercise_id, completed, completed_at)
+            VALUES (?, ?, '', TRUE, ?)
+            ON CONFLICT (user_id, lesson_id, exercise_id)
+            DO UPDATE SET completed = TRUE, completed_at = excluded.completed_at
+        ''', (user_id, lesson_id, completed_at))
+
+        # Changes exactly one row only the first time the lesson is completed
+        cursor = conn.execute('''
+            INSERT INTO user_lesson_stats (user_id, lesson_id, completed)
+            VALUES (?, ?, TRUE)
+            ON CONFLICT (user_id, lesson_id)
+            DO UPDATE SET completed = TRUE WHERE NOT completed
+        ''', (user_id, lesson_id))
+        newly_completed = 1 if cursor.rowcount == 1 else 0
+
+        # Completions uploaded late don't replace a more recent last lesson
+        conn.execute('''
+            INSERT INTO user_stats
+                (user_id, completed_count, last_completed_lesson_id, last_completed_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                completed_count = completed_count + excluded.completed_count,
+                last_completed_lesson_id = CASE
+                    WHEN excluded.last_completed_at >= COALESCE(last_completed_at, '')
+                    THEN excluded.last_completed_lesson_id
+                    ELSE last_completed_lesson_id
+                END,
+                last_completed_at = MAX(COALESCE(last_completed_at, ''), excluded.last_completed_at),
+                updated_at = excluded.updated_at
+        ''', (user_id, newly_completed, lesson_id, completed_at, datetime.now().isoformat()))
+        return newly_completed == 1
+
+    def _pass_exercise(self, conn, user_id, lesson_id, exercise_id, passed_at):
+        """Record an exercise pass, returns True the first time the exercise is passed"""
+        # Changes no row when the exercise was already passed
+        cursor = conn.execute('''
+            INSERT INTO user_progress (user_id, lesson_id, exercise_id, test_passed, completed_at)
+            VALUES (?, ?, ?, TRUE, ?)
+            ON CONFLICT (user_id, lesson_id, exercise_id)
+            DO UPDATE SET test_passed = TRUE, completed_at = excluded.completed_at
+            WHERE NOT test_passed
+        ''', (user_id, lesson_id, exercise_id, passed_at))
+
+        if cursor.rowcount != 1:
+            return False
+
+        conn.execute('''
+            INSERT INTO user_lesson_stats (user_id, lesson_id, passed_exercises)
+            VALUES (?, ?, 1)
+            ON CONFLICT (user_id, lesson_id)
+            DO UPDATE SET passed_exercises = passed_exercises + 1
+        ''', (user_id, lesson_id))
+        return True
+
+    def _stamp_changes(self, conn, user_id, lesson_ids):
+        """Give the changed lesson rows of a user the next sync sequence number"""
+        if not lesson_ids:
+            return
+
+        conn.execute('''
+            INSERT INTO user_stats (user_id, sync_seq, updated_at)
+            VALUES (?, 1, ?)
+            ON CONFLICT (user_id) DO UPDATE SET sync_seq = sync_seq + 1
+        ''', (user_id, datetime.now().isoformat()))
+        seq = conn.execute(
+            'SELECT sync_seq FROM user_stats WHERE user_id = ?', (user_id,)
+        ).fetchone()[0]
+
+        conn.executemany('''
+            UPDATE user_lesson_stats SET changed_seq = ? WHERE user_id = ? AND lesson_id = ?
+        ''', [(seq, user_id, lesson_id) for lesson_id in lesson_ids])
+
+    @db_query_seconds.time('mark_lesson_complete')
+    def mark_lesson_complete(self, lesson_id, user_id=DEFAULT_USER_ID):
         """Mark a lesson as completed"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                INSERT OR REPLACE INTO user_progress (lesson_id, completed, completed_at)
-                VALUES (?, TRUE, ?)
-            ''', (lesson_id, datetime.now().isoformat()))
-
-            conn.commit()
-            conn.close()
+            with self.connections.transaction() as conn:
+                if self._complete_lesson(conn, user_id, lesson_id, datetime.now().isoformat()):
+                    self._stamp_changes(conn, user_id, [lesson_id])
         except Exception as e:
             print(f"Error marking lesson complete: {e}")
 
-    def mark_exercise_complete(self, lesson_id, exercise_id):
+    @db_query_seconds.time('mark_exercise_complete')
+    def mark_exercise_complete(self, lesson_id, exercise_id, user_id=DEFAULT_USER_ID):
         """Mark an exercise as completed"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                INSERT OR REPLACE INTO user_progress (lesson_id, exercise_id, test_passed, completed_at)
-                VALUES (?, ?, TRUE, ?)
-            ''', (lesson_id, exercise_id, datetime.now().isoformat()))
-
-            conn.commit()
-            conn.close()
+            with self.connections.transaction() as conn:
+                if self._pass_exercise(conn, user_id, lesson_id, exercise_id, datetime.now().isoformat()):
+                    self._stamp_changes(conn, user_id, [lesson_id])
         except Exception as e:
             print(f"Error marking exercise complete: {e}")
 
-    def save_code_submission(self, lesson_id, exercise_id, code, output, success):
-        """Save code submission for an exercise"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+    @db_query_seconds.time('sync_progress')
+    def sync_progress(self, events, since=None, user_id=DEFAULT_USER_ID):
+        """
+        Apply a batch of progress events in one transaction and get what changed
+
+        Events already applied, by an earlier upload of the same batch, are skipped.
+
+        Args:
+            events: Checked events, see services.progress_events.parse_events
+            since: Sync token returned by the client's last sync, None for everything
+            user_id: User the events belong to
+
+        Returns:
+            {
+                'applied': int,       # events applied now
+                'duplicates': int,    # events applied before
+                'sync_token': str,    # send as since on the next sync
+                'lessons': [          # lesson progress changed since the token
+                    {'lesson_id': str, 'completed': bool, 'passed_exercises': int}
+                ]
+            }
+        """
+        applied = 0
+        changed = []
+        received_at = datetime.now().isoformat()
+
+        with self.connections.transaction() as conn:
+            # In the order they happened, the last completion sets the current lesson
+            for event in sorted(events, key=lambda event: event['occurred_at']):
+                cursor = conn.execute('''
+                    INSERT INTO progress_events
+                        (user_id, event_id, type, lesson_id, occurred_at, received_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (user_id, event_id) DO NOTHING
+                ''', (user_id, event['event_id'], event['type'], event['lesson_id'],
+                      event['occurred_at'], received_at))
+                if cursor.rowcount != 1:
+                    continue
+                applied += 1
+
+                # Only lesson completions are synced, exercise passes need graded code
+                is_new = self._complete_lesson(conn, user_id, event['lesson_id'], event['occurred_at'])
+                if is_new and event['lesson_id'] not in changed:
+                    changed.append(event['lesson_id'])
+
+            self._stamp_changes(conn, user_id, changed)
+
+            row = conn.execute(
+                'SELECT sync_seq FROM user_stats WHERE user_id = ?', (user_id,)
+            ).fetchone()
+            rows = conn.execute('''
+                SELECT lesson_id, completed, passed_exercises FROM user_lesson_stats
+                WHERE user_id = ? AND changed_seq > ?
+            ''', (user_id, since if since is not None else -1)).fetchall()
 
-            cursor.execute('''
-                INSERT INTO code_submissions (lesson_id, exercise_id, code, output, success)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (lesson_id, exercise_id, code, output, success))
+        return {
+            'applied': applied,
+            'duplicates': len(events) - applied,
+            'sync_token': str(row[0] if row else 0),
+            'lessons': [
+                {'lesson_id': lesson_id, 'completed': bool(completed), 'passed_exercises': passed}
+                for lesson_id, completed, passed in rows
+            ]
+        }
 
-            conn.commit()
-            conn.close()
+    def save_code_submission(self, lesson_id, exercise_id, code, output, success, user_id=DEFAULT_USER_ID):
+        """Save code submission for an exercise"""
+        try:
+            self.save_code_submissions([(lesson_id, exercise_id, code, output, success, user_id)])
         except Exception as e:
             print(f"Error saving code submission: {e}")
 
-    def get_progress(self):
-        """Get overall user progress"""
-        lessons = self.get_all_lessons()
-        total = len(lessons)
+    @db_query_seconds.time('save_code_submissions')
+    def save_code_submissions(self, rows):
+        """
+        Save many code submissions in one transaction
+
+        Args:
+            rows: List of (lesson_id, exercise_id, code, output, success, user_id) tuples
+        """
+        with self.connections.transaction() as conn:
+            # Re-runs of the same code mostly repeat texts within a batch too
+            known = {}
+            conn.executemany('''
+                INSERT INTO code_submissions (lesson_id, exercise_id, code_blob, output_blob, success, user_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (lesson_id, exercise_id,
+                 self.blobs.put(conn, code, known),
+                 self.blobs.put(conn, output, known) if output is not None else None,
+                 success, user_id)
+                for lesson_id, exercise_id, code, output, success, user_id in rows
+            ])
+
+    def iter_code_submissions(self, lesson_id=None, exercise_id=None, batch_size=500):
+        """
+        Read code submissions in id order, one batch at a time
+
+        Batches are read by id range, so no read transaction stays open
+        between batches and writes can go on meanwhile.
+
+        Args:
+            lesson_id: Only submissions of this lesson
+            exercise_id: Only submissions of this exercise
+            batch_size: Number of rows per batch
+
+        Yields:
+            Lists of (submission_id, exercise_id, code) tuples
+        """
+        conditions = ['id > ?']
+        params = []
+        if lesson_id:
+            conditions.append('lesson_id = ?')
+            params.append(lesson_id)
+        if exercise_id:
+            conditions.append('exercise_id = ?')
+            params.append(exercise_id)
+
+        query = f'''
+            SELECT id, exercise_id, code_blob FROM code_submissions
+            WHERE {' AND '.join(conditions)}
+            ORDER BY id LIMIT ?
+        '''
+
+        last_id = 0
+        while True:
+            conn = self.connections.connection()
+            rows = conn.execute(query, [last_id] + params + [batch_size]).fetchall()
+            if not rows:
+                return
+
+            # Each distinct program of the batch is read and decompressed once
+            codes = self.blobs.get_many(conn, [code_blob for _, _, code_blob in rows])
+            yield [
+                (submission_id, submission_exercise_id, codes[code_blob])
+                for submission_id, submission_exercise_id, code_blob in rows
+                if code_blob in codes
+            ]
+            last_id = rows[-1][0]
+
+    @db_query_seconds.time('get_submission_history')
+    def get_submission_history(self, user_id=DEFAULT_USER_ID, exercise_id=None, before=None, limit=50):
+        """
+        Get one page of a user's submissions, newest first
+
+        Args:
+            user_id: User whose submissions are read
+            exercise_id: Only submissions of this exercise
+            before: Cursor returned with the previous page, None for the first page
+            limit: Number of submissions per page
+
+        Returns:
+            (submissions, cursor of the next page or None on the last page)
+        """
+        conditions = ['user_id = ?']
+        params = [user_id]
+        if exercise_id:
+            conditions.append('exercise_id = ?')
+            params.append(exercise_id)
+        if before is not None:
+            conditions.append('id < ?')
+            params.append(before)
+
+        conn = self.connections.connection()
+        rows = conn.execute(f'''
+            SELECT id, lesson_id, exercise_id, code_blob, output_blob, success, submitted_at
+            FROM code_submissions
+            WHERE {' AND '.join(conditions)}
+            ORDER BY id DESC LIMIT ?
+        ''', params + [limit + 1]).fetchall()
+
+        # One row more than asked tells whether there is a next page
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        rows = rows[:limit]
+
+        texts = self.blobs.get_many(conn, [row[3] for row in rows] + [row[4] for row in rows])
+        submissions = [
+            {
+                'id': submission_id,
+                'lesson_id': lesson_id,
+                'exercise_id': exercise_id,
+                'code': texts.get(code_blob),
+                'output': texts.get(output_blob),
+                'success': bool(success),
+                'submitted_at': submitted_at
+            }
+            for submission_id, lesson_id, exercise_id, code_blob, output_blob, success, submitted_at in rows
+        ]
+        return submissions, next_cursor
+
+    @db_query_seconds.time('get_submission_summary')
+    def get_submission_summary(self, user_id=DEFAULT_USER_ID):
+        """
+        Get run counts of a user per exercise, rolled up runs included
+
+        Returns:
+            List of {lesson_id, exercise_id, runs, successes, first_at, last_at}
+        """
+        rows = self.connections.connection().execute('''
+            SELECT lesson_id, exercise_id, SUM(runs), SUM(successes), MIN(first_at), MAX(last_at)
+            FROM (
+                SELECT lesson_id, exercise_id, runs, successes, first_at, last_at
+                FROM submission_rollups WHERE user_id = ?
+                UNION ALL
+                SELECT lesson_id, exercise_id, COUNT(*), COALESCE(SUM(success), 0),
+                       MIN(submitted_at), MAX(submitted_at)
+                FROM code_submissions WHERE user_id = ?
+                GROUP BY lesson_id, exercise_id
+            )
+            GROUP BY lesson_id, exercise_id
+            ORDER BY lesson_id, exercise_id
+        ''', (user_id, user_id)).fetchall()
+
+        return [
+            {
+                'lesson_id': lesson_id,
+                'exercise_id': exercise_id,
+                'runs': runs,
+                'successes': successes,
+                'first_at': first_at,
+                'last_at': last_at
+            }
+            for lesson_id, exercise_id, runs, successes, first_at, last_at in rows
+        ]
+
+    @db_query_seconds.time('apply_retention')
+    def apply_retention(self, max_age_days=30, keep_latest=20, batch_size=5000):
+        """
+        Roll old submissions up into per-exercise counts and delete them
+
+        A submission is rolled up once it is older than max_age_days and
+        not among the keep_latest newest of its user and exercise. Each
+        batch is its own transaction, so writers are never blocked for long.
+        Blobs no submission refers to any more are deleted at the end.
+
+        Returns:
+            {'rolled_up': int, 'blobs_deleted': int}
+        """
+        expired = [row[0] for row in self.connections.connection().execute('''
+            SELECT id FROM (
+                SELECT id, submitted_at, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, lesson_id, exercise_id ORDER BY id DESC
+                ) AS newer
+                FROM code_submissions
+            )
+            WHERE newer > ? AND submitted_at < datetime('now', ?)
+            ORDER BY id
+        ''', (keep_latest, f'-{int(max_age_days)} days'))]
+
+        for start in range(0, len(expired), batch_size):
+            with self.connections.transaction() as conn:
+                conn.execute('CREATE TEMP TABLE IF NOT EXISTS expired_submissions (id INTEGER PRIMARY KEY)')
+                conn.execute('DELETE FROM expired_submissions')
+                conn.executemany(
+                    'INSERT INTO expired_submissions (id) VALUES (?)',
+                    [(submission_id,) for submission_id in expired[start:start + batch_size]]
+                )
+
+                conn.execute('''
+                    INSERT INTO submission_rollups
+                        (user_id, lesson_id, exercise_id, runs, successes, first_at, last_at)
+                    SELECT user_id, lesson_id, exercise_id, COUNT(*), COALESCE(SUM(success), 0),
+                           MIN(submitted_at), MAX(submitted_at)
+                    FROM code_submissions
+                    WHERE id IN (SELECT id FROM expired_submissions)
+                    GROUP BY user_id, lesson_id, exercise_id
+                    ON CONFLICT (user_id, lesson_id, exercise_id) DO UPDATE SET
+                        runs = runs + excluded.runs,
+                        successes = successes + excluded.successes,
+                        first_at = MIN(first_at, excluded.first_at),
+                        last_at = MAX(last_at, excluded.last_at)
+                ''')
+                conn.execute('''
+                    DELETE FROM submission_grades WHERE submission_id IN (SELECT id FROM expired_submissions)
+                ''')
+                conn.execute('''
+                    DELETE FROM code_submissions WHERE id IN (SELECT id FROM expired_submissions)
+                ''')
+
+        with self.connections.transaction() as conn:
+            blobs_deleted = self.blobs.delete_unreferenced(conn)
+
+        return {'rolled_up': len(expired), 'blobs_deleted': blobs_deleted}
+
+    @db_query_seconds.time('save_grades')
+    def save_grades(self, rows):
+        """
+        Save the grades of many submissions in one transaction
+
+        Args:
+            rows: List of (submission_id, exercise_id, passed, passed_cases, total_cases) tuples
+        """
+        now = datetime.now().isoformat()
+        with self.connections.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO submission_grades
+                    (submission_id, exercise_id, passed, passed_cases, total_cases, graded_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (submission_id) DO UPDATE SET
+                    exercise_id = excluded.exercise_id,
+                    passed = excluded.passed,
+                    passed_cases = excluded.passed_cases,
+                    total_cases = excluded.total_cases,
+                    graded_at = excluded.graded_at
+            ''', [row + (now,) for row in rows])
+
+    @db_query_seconds.time('get_progress')
+    def get_progress(self, user_id=DEFAULT_USER_ID):
+        """Get overall progress of a user"""
+        total = len(self.catalog)
         completed = 0
-        current_lesson_id = lessons[0]['id'] if lessons else None
+        current_lesson_id = self.catalog.get_first_lesson_id()
 
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            result = self.connections.connection().execute('''
+                SELECT completed_count, last_completed_lesson_id FROM user_stats WHERE user_id = ?
+            ''', (user_id,)).fetchone()
 
-            # Completed lessons
-            cursor.execute('SELECT COUNT(DISTINCT lesson_id) FROM user_progress WHERE completed = TRUE')
-            result = cursor.fetchone()
             if result:
                 completed = result[0]
 
-            # Current lesson (next incomplete)
-            cursor.execute('''
-                SELECT lesson_id FROM user_progress WHERE completed = TRUE ORDER BY completed_at DESC LIMIT 1
-            ''')
-            current_result = cursor.fetchone()
-            if current_result:
-                # Get next lesson
-                current_id = current_result[0]
-                for lesson in lessons:
-                    if lesson['id'] == current_id:
-                        idx = lessons.index(lesson)
-                        if idx + 1 < len(lessons):
-                            current_lesson_id = lessons[idx + 1]['id']
-                        break
-
-            conn.close()
+                # Current lesson is the one after the last completed lesson
+                next_id = self.catalog.get_next_lesson_id(result[1])
+                if next_id:
+                    current_lesson_id = next_id
         except Exception as e:
             print(f"Error getting progress: {e}")
 
@@ -209,29 +848,29 @@ class Database:
             'percentage': (completed / total * 100) if total > 0 else 0
         }
 
-    def get_lesson_progress(self, lesson_id):
-        """Get progress for a specific lesson"""
+    @db_query_seconds.time('get_lesson_progress')
+    def get_lesson_progress(self, lesson_id, user_id=DEFAULT_USER_ID):
+        """Get progress of a user for a specific lesson"""
         passed_exercises = 0
 
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            result = self.connections.connection().execute('''
+                SELECT passed_exercises FROM user_lesson_stats
+                WHERE user_id = ? AND lesson_id = ?
+            ''', (user_id, lesson_id)).fetchone()
 
-            cursor.execute('''
-                SELECT COUNT(*) FROM user_progress
-                WHERE lesson_id = ? AND test_passed = TRUE
-            ''', (lesson_id,))
-
-            result = cursor.fetchone()
             if result:
                 passed_exercises = result[0]
-
-            conn.close()
         except Exception as e:
-            # If column doesn't exist or other error, return 0
+            # If table doesn't exist or other error, return 0
             passed_exercises = 0
 
         return {
             'lesson_id': lesson_id,
             'passed_exercises': passed_exercises
         }
+
+    def close(self):
+        """Close all database connections and stop watching lesson files"""
+        self.catalog.close()
+        self.connections.close_all()
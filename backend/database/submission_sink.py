@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import deque
+
+from database.db import DEFAULT_USER_ID
+
+
+class SubmissionSink:
+    """Background writer for code submissions
+
+    Submissions are queued in memory and written with executemany in one
+    transaction every batch_size records or flush_interval_ms milliseconds,
+    so requests never wait on a SQLite commit. close() writes whatever is
+    still queued.
+
+    When a batch fails its submissions are written one at a time, so one bad
+    submission doesn't hold back the others. Submissions that still fail are
+    retried with the next flushes, waiting longer after every failed flush,
+    and dropped after max_attempts.
+    """
+
+    def __init__(self, db, batch_size=100, flush_interval_ms=500, max_queue=10000,
+                 max_attempts=3, max_backoff_ms=30000):
+        """
+        Initialize submission sink
+
+        Args:
+            db: Database the submissions are written to
+            batch_size: Number of queued submissions that triggers a write
+            flush_interval_ms: Maximum time a submission waits in the queue
+            max_queue: Queue size at which new submissions are dropped
+            max_attempts: Writes of a submission before it is dropped
+            max_backoff_ms: Longest wait between flushes after failures
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff_ms / 1000
+
+        self._queue = deque()
+        self._retries = []   # (row, attempts) of submissions that failed to write
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.last_flush_ms = 0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, lesson_id, exercise_id, code, output, success, user_id=DEFAULT_USER_ID):
+        """
+        Queue a code submission to be saved, never waits for the writer
+
+        Returns:
+            False if the queue is full and the submission was dropped
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Submission sink is closed')
+
+            # Dropping beats blocking request threads or the event loop on a stuck writer
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                if self.rejected == 1 or self.rejected % 1000 == 0:
+                    print(f"Submission queue full, {self.rejected} code submissions rejected")
+                return False
+
+            self._queue.append((lesson_id, exercise_id, code, output, success, user_id))
+            self.submitted += 1
+
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def _run(self):
+        failed_flushes = 0
+        while True:
+            with self._cond:
+                if failed_flushes:
+                    # Back off instead of hammering a database that keeps failing
+                    backoff = min(self.flush_interval * 2 ** failed_flushes, self.max_backoff)
+                    self._cond.wait_for(lambda: self._closed, timeout=backoff)
+                else:
+                    self._cond.wait_for(
+                        lambda: self._closed or len(self._queue) >= self.batch_size,
+                        timeout=self.flush_interval
+                    )
+                if self._closed:
+                    return
+
+            failed_flushes = 0 if self.flush() else failed_flushes + 1
+
+    def flush(self):
+        """
+        Write all queued submissions now
+
+        Returns:
+            False if some submissions failed and wait for a retry
+        """
+        with self._write_lock:
+            with self._cond:
+                rows = list(self._queue)
+                self._queue.clear()
+
+            # Earlier failures go first to keep the order
+            batch = self._retries + [(row, 0) for row in rows]
+            self._retries = []
+            if not batch:
+                return True
+
+            start_time = time.time()
+            try:
+                self.db.save_code_submissions([row for row, _ in batch])
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                print(f"Error writing {len(batch)} code submissions, writing them one by one: {e}")
+                self.failures += 1
+                self._write_each(batch)
+
+            self.last_flush_ms = (time.time() - start_time) * 1000
+            return not self._retries
+
+    def _write_each(self, batch):
+        """Write submissions one at a time, keeping the failed ones for a retry"""
+        for row, attempts in batch:
+            try:
+                self.db.save_code_submissions([row])
+                self.written += 1
+            except Exception as e:
+                attempts += 1
+                if attempts < self.max_attempts:
+                    self._retries.append((row, attempts))
+                else:
+                    self.dropped += 1
+                    print(f"Dropped code submission for lesson {row[0]}, exercise {row[1]} "
+                          f"after {attempts} attempts: {e}")
+
+    def stats(self):
+        """Get queue depth and write counters"""
+        return {
+            'queue_depth': len(self._queue),
+            'submitted': self.submitted,
+            'written': self.written,
+            'batches': self.batches,
+            'failures': self.failures,
+            'retrying': len(self._retries),
+            'rejected': self.rejected,
+            'dropped': self.dropped,
+            'last_flush_ms': self.last_flush_ms
+        }
+
+    def close(self):
+        """Stop the writer thread and save everything still queued"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+
+        self._thread.join()
+        # Every flush uses up an attempt of the failed submissions, so this ends
+        while not self.flush() and self._retries:
+            pass
+
+        if self._retries:
+            print(f"Lost {len(self._retries)} code submissions on shutdown")
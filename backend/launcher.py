@@ -6,9 +6,10 @@ This file is used to start the application
 
 import sys
 import os
-import webbrowser
+import signal
 import time
-from pathlib import Path
+
+launcher_start = time.perf_counter()
 
 # Add the backend directory to the path
 backend_dir = os.path.dirname(os.path.abspath(__file__))
@@ -20,13 +21,8 @@ os.environ['FLASK_ENV'] = 'production'
 def main():
     """Start the application"""
     try:
-        print(f"Python path: {sys.path}")
-        print(f"Backend dir: {backend_dir}")
-        print("Importing app...")
-
-        # Import after adding to path
-        from app import app
-        from waitress import serve
+        # waitress (threads) or asgi (uvicorn, async executions)
+        server_mode = os.environ.get('SERVER_MODE', 'waitress')
 
         port = int(os.environ.get('PORT', 5001))
         host = '0.0.0.0'
@@ -43,6 +39,7 @@ def main():
             def open_browser():
                 time.sleep(2)
                 try:
+                    import webbrowser
                     webbrowser.open(f'http://localhost:{port}')
                 except:
                     pass
@@ -52,6 +49,31 @@ def main():
             browser_thread = threading.Thread(target=open_browser, daemon=True)
             browser_thread.start()
 
+        if server_mode == 'asgi':
+            import uvicorn
+
+            # uvicorn drains open requests on SIGTERM before the lifespan shutdown
+            print(f"Uvicorn serveri başlatılıyor...\n")
+            uvicorn.run(
+                'asgi:app',
+                app_dir=backend_dir,
+                host=host,
+                port=port,
+                workers=int(os.environ.get('WEB_CONCURRENCY', 1)),
+                timeout_graceful_shutdown=int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+            )
+            return
+
+        # Import after adding to path
+        from app import app, startup_timings
+        from waitress import serve
+
+        startup_timings['launcher'] = round((time.perf_counter() - launcher_start) * 1000, 1)
+        print(f"✓ Başlatma süresi (ms): {startup_timings}")
+
+        # Exit normally on SIGTERM so shutdown hooks flush pending writes
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
         # Start server
         print(f"Waitress serveri başlatılıyor...\n")
         serve(app, host=host, port=port, _quiet=False)
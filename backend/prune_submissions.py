@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+Apply the retention policy to stored code submissions
+Submissions older than --days, except the --keep newest of every user and
+exercise, are rolled up into per-exercise run counts and deleted, together
+with the code and output blobs nothing refers to any more
+"""
+
+import argparse
+import os
+import sys
+
+# Add the backend directory to the path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from database.db import Database
+
+
+def main():
+    """Prune submissions"""
+    parser = argparse.ArgumentParser(description='Roll up and delete old code submissions')
+    parser.add_argument('--days', type=int, default=int(os.environ.get('SUBMISSION_RETENTION_DAYS', 30)),
+                        help='keep submissions younger than this many days (default: 30)')
+    parser.add_argument('--keep', type=int, default=int(os.environ.get('SUBMISSION_KEEP_LATEST', 20)),
+                        help='always keep this many newest submissions per user and exercise (default: 20)')
+    parser.add_argument('--db', help='database file, defaults to the server database')
+    parser.add_argument('--vacuum', action='store_true', help='give the freed space back to the file system')
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    try:
+        size_before = os.path.getsize(db.db_path)
+        stats = db.apply_retention(max_age_days=args.days, keep_latest=args.keep)
+        if args.vacuum:
+            db.compact()
+        size_after = os.path.getsize(db.db_path)
+    finally:
+        db.close()
+
+    print(f"✓ {stats['rolled_up']} submissions rolled up, {stats['blobs_deleted']} blobs deleted "
+          f"({size_before} -> {size_after} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Re-grade stored code submissions
+Runs every submission against the current test cases of its exercise and
+writes the results to the submission_grades table
+"""
+
+import argparse
+import os
+import sys
+
+# Add the backend directory to the path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from database.db import Database
+from services.batch_grader import BatchGrader
+from services.code_executor import CodeExecutor
+
+
+def main():
+    """Re-grade submissions"""
+    parser = argparse.ArgumentParser(description='Re-grade stored code submissions')
+    parser.add_argument('--lesson', help='only submissions of this lesson')
+    parser.add_argument('--exercise', help='only submissions of this exercise')
+    parser.add_argument('--db', help='database file, defaults to the server database')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes running the code (default: number of cores)')
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='submissions read and written per transaction')
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    executor = CodeExecutor(timeout=5, max_output=10000, workers=args.workers)
+
+    def report(stats):
+        print(f"  {stats['submissions']} submissions, {stats['unique']} unique programs, "
+              f"{stats['submissions_per_second']:.1f}/s", flush=True)
+
+    try:
+        grader = BatchGrader(db, executor, batch_size=args.batch_size)
+        stats = grader.grade(args.lesson, args.exercise, on_progress=report)
+    finally:
+        executor.close()
+        db.close()
+
+    print(f"✓ {stats['submissions']} submissions re-graded in {stats['seconds']:.1f}s "
+          f"({stats['submissions_per_second']:.1f}/s): {stats['passed']} passed, "
+          f"{stats['failed']} failed, {stats['skipped']} skipped (unknown exercise)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+
+def update_rate(stats, start_time):
+    """Set the elapsed seconds and the rate, a coarse clock can report no time passed"""
+    stats['seconds'] = time.time() - start_time
+    if stats['seconds'] > 0:
+        stats['submissions_per_second'] = stats['submissions'] / stats['seconds']
+
+
+class BatchGrader:
+    """Re-grade stored code submissions against the current exercise test cases
+
+    Submissions are read in batches. Identical programs for the same exercise
+    are graded once, the unique ones run in parallel on the executor's worker
+    processes, and the grades of each batch are written in one transaction.
+    """
+
+    def __init__(self, db, executor, batch_size=500, concurrency=None):
+        """
+        Initialize batch grader
+
+        Args:
+            db: Database the submissions are read from and the grades written to
+            executor: CodeExecutor that runs the tests
+            batch_size: Number of submissions read and written at a time
+            concurrency: Number of programs graded at the same time,
+                defaults to the executor's worker count
+        """
+        self.db = db
+        self.executor = executor
+        self.batch_size = batch_size
+        self.concurrency = concurrency or executor.worker_count or os.cpu_count() or 1
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {'running': False}
+
+    def _grade_program(self, code, exercise):
+        result = self.executor.run_tests(code, exercise['test_cases'])
+        return result['success'], result['passed'], result['total']
+
+    def grade(self, lesson_id=None, exercise_id=None, on_progress=None) -> Dict[str, Any]:
+        """
+        Re-grade submissions, optionally only those of one lesson or exercise
+
+        Args:
+            lesson_id: Only submissions of this lesson
+            exercise_id: Only submissions of this exercise
+            on_progress: Called with the stats after every batch
+
+        Returns:
+            {
+                'submissions': int,          # submissions graded
+                'unique': int,               # distinct programs that were run
+                'passed': int,
+                'failed': int,
+                'skipped': int,              # submissions of unknown exercises
+                'seconds': float,
+                'submissions_per_second': float
+            }
+        """
+        start_time = time.time()
+        stats = {
+            'submissions': 0,
+            'unique': 0,
+            'passed': 0,
+            'failed': 0,
+            'skipped': 0,
+            'seconds': 0,
+            'submissions_per_second': 0
+        }
+
+        # (exercise id, hash of the code) -> (passed, passed_cases, total_cases)
+        grades = {}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for batch in self.db.iter_code_submissions(lesson_id, exercise_id, self.batch_size):
+                keyed = []
+                pending = {}
+
+                for submission_id, submission_exercise_id, code in batch:
+                    exercise = self.db.get_exercise(submission_exercise_id)
+                    if exercise is None:
+                        stats['skipped'] += 1
+                        continue
+
+                    digest = hashlib.sha256(code.encode('utf-8', 'surrogatepass')).digest()
+                    key = (submission_exercise_id, digest)
+                    if key not in grades and key not in pending:
+                        pending[key] = pool.submit(self._grade_program, code, exercise)
+                    keyed.append((submission_id, submission_exercise_id, key))
+
+                for key, future in pending.items():
+                    grades[key] = future.result()
+                stats['unique'] += len(pending)
+
+                rows = []
+                for submission_id, submission_exercise_id, key in keyed:
+                    passed, passed_cases, total_cases = grades[key]
+                    rows.append((submission_id, submission_exercise_id, passed, passed_cases, total_cases))
+                    stats['passed' if passed else 'failed'] += 1
+
+                if rows:
+                    self.db.save_grades(rows)
+                stats['submissions'] += len(rows)
+
+                update_rate(stats, start_time)
+                if on_progress:
+                    on_progress(dict(stats))
+
+        update_rate(stats, start_time)
+        return stats
+
+    def start(self, lesson_id=None, exercise_id=None) -> bool:
+        """
+        Re-grade in a background thread
+
+        Returns:
+            False if a re-grade is already running
+        """
+        with self._lock:
+            if self._status['running']:
+                return False
+            self._status = {
+                'running': True,
+                'lesson_id': lesson_id,
+                'exercise_id': exercise_id,
+                'stats': None,
+                'error': None
+            }
+
+        def run():
+            try:
+                stats = self.grade(lesson_id, exercise_id, on_progress=self._update_stats)
+                self._update_stats(stats)
+            except Exception as e:
+                print(f"Error re-grading submissions: {e}")
+                with self._lock:
+                    self._status['error'] = str(e)
+            finally:
+                with self._lock:
+                    self._status['running'] = False
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        return True
+
+    def _update_stats(self, stats):
+        with self._lock:
+            self._status['stats'] = stats
+
+    def status(self) -> Dict[str, Any]:
+        """Get the progress of the last background re-grade"""
+        with self._lock:
+            return dict(self._status)
@@ -0,0 +1,104 @@
+"""
+Exercise index built from the lesson files
+
+Maps every exercise id to its lesson and test cases. Expected outputs are
+normalized once when the lessons are loaded, and each exercise picks how
+output is compared with the optional "match" field of the exercise or of a
+single test case:
+
+    contains  expected output appears anywhere in the output (default)
+    exact     whole output equals the expected output, ignoring surrounding whitespace
+    lines     like exact, also ignoring trailing whitespace on every line
+"""
+
+DEFAULT_MATCH = 'contains'
+
+
+def _normalize_lines(text):
+    return '\n'.join(line.rstrip() for line in text.strip().splitlines())
+
+
+# mode -> (normalize expected output once, compare output with normalized expected)
+MATCHERS = {
+    'contains': (str.strip, lambda output, expected: expected in output),
+    'exact': (str.strip, lambda output, expected: output.strip() == expected),
+    'lines': (_normalize_lines, lambda output, expected: _normalize_lines(output) == expected),
+}
+
+
+def match_output(mode, output, expected):
+    """
+    Compare program output with a normalized expected output
+
+    Args:
+        mode: Comparison mode, one of MATCHERS
+        output: Actual output
+        expected: Expected output, already normalized for mode
+
+    Returns:
+        True if output matches
+    """
+    return MATCHERS[mode][1](output, expected)
+
+
+def _test_inputs(test):
+    """Lines fed to input(), lesson files keep them in one newline separated string"""
+    inputs = test.get('inputs')
+    if inputs is not None:
+        return [str(value) for value in inputs]
+
+    text = test.get('input', '')
+    return text.split('\n') if text else []
+
+
+def build_exercise(lesson_id, exercise):
+    """Build the index entry of a single exercise"""
+    exercise_match = exercise.get('match', DEFAULT_MATCH)
+    test_cases = []
+
+    for test in exercise.get('test_cases', []):
+        mode = test.get('match', exercise_match)
+        if mode not in MATCHERS:
+            print(f"Unknown match mode '{mode}' in exercise {exercise.get('id')}, using {DEFAULT_MATCH}")
+            mode = DEFAULT_MATCH
+
+        expected_output = str(test.get('expected_output', ''))
+        test_cases.append({
+            'inputs': _test_inputs(test),
+            'expected_output': expected_output,
+            'expected': MATCHERS[mode][0](expected_output),
+            'match': mode
+        })
+
+    return {
+        'id': exercise.get('id'),
+        'lesson_id': lesson_id,
+        'test_cases': test_cases
+    }
+
+
+def build_exercise_index(lessons):
+    """
+    Index the exercises of all lessons
+
+    Args:
+        lessons: Lessons in order, earlier lessons win when exercise ids collide
+
+    Returns:
+        Dictionary of exercise id -> exercise entry
+    """
+    index = {}
+
+    for lesson in lessons:
+        for section in lesson.get('sections', []):
+            exercise = section.get('exercise')
+            if not exercise or not exercise.get('id'):
+                continue
+
+            if exercise['id'] in index:
+                print(f"Duplicate exercise id {exercise['id']} in lesson {lesson.get('id')}, ignored")
+                continue
+
+            index[exercise['id']] = build_exercise(lesson.get('id'), exercise)
+
+    return index
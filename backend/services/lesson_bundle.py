@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import json
+import os
+import struct
+import threading
+from collections import namedtuple
+
+BUNDLE_MAGIC = b'PLBUNDLE'
+BUNDLE_VERSION = 1
+
+# Key of the lesson index inside the bundle, lesson ids never start with '/'
+INDEX_KEY = '/index'
+
+# Pre-serialized response: JSON bytes, gzipped JSON bytes and a strong ETag
+PackedResponse = namedtuple('PackedResponse', ['body', 'gzip_body', 'etag', 'source'])
+
+
+def pack(payload, source):
+    """
+    Serialize and compress a response payload once
+
+    Args:
+        payload: JSON-serializable response
+        source: Revision of the content the payload was built from
+    """
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    return PackedResponse(body, gzip.compress(body, mtime=0), etag, source)
+
+
+class LessonBundle:
+    """Pre-serialized, pre-gzipped lesson responses
+
+    Entries can be loaded from a bundle file produced at build time
+    (see build_lessons.py). Entries whose source revision no longer matches
+    the lesson catalog are repacked on first use.
+    """
+
+    def __init__(self, catalog, path=None):
+        """
+        Initialize lesson bundle
+
+        Args:
+            catalog: LessonCatalog providing lessons and their revisions
+            path: Bundle file to load, ignored if missing or outdated
+        """
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._entries = {}
+
+        if path and os.path.exists(path):
+            try:
+                self._entries = self.read(path)
+            except Exception as e:
+                print(f"Error loading lesson bundle {path}: {e}")
+
+    def _get(self, key, source, build_payload):
+        entry = self._entries.get(key)
+        if entry is not None and entry.source == source:
+            return entry
+
+        entry = pack(build_payload(), source)
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def get_index(self):
+        """Get the packed lesson list response"""
+        return self._get(
+            INDEX_KEY,
+            self.catalog.index_revision,
+            lambda: {'success': True, 'lessons': self.catalog.get_all_lessons()}
+        )
+
+    def get_lesson(self, lesson_id):
+        """Get the packed response for a lesson, None if it does not exist"""
+        source = self.catalog.get_revision(lesson_id)
+        if source is None:
+            return None
+
+        return self._get(
+            lesson_id,
+            source,
+            lambda: {'success': True, 'lesson': self.catalog.get_lesson(lesson_id)}
+        )
+
+    def pack_all(self):
+        """Make sure every lesson and the index are packed"""
+        self.get_index()
+        for lesson in self.catalog.get_all_lessons():
+            self.get_lesson(lesson['id'])
+
+    def write(self, path):
+        """
+        Write all packed entries to a bundle file
+
+        Layout: magic, header length, JSON header with offsets, then the
+        raw and gzipped bodies back to back.
+        """
+        header = {'version': BUNDLE_VERSION, 'entries': {}}
+        blobs = []
+        offset = 0
+
+        for key, entry in sorted(self._entries.items()):
+            header['entries'][key] = {
+                'source': entry.source,
+                'etag': entry.etag,
+                'body': [offset, len(entry.body)],
+                'gzip_body': [offset + len(entry.body), len(entry.gzip_body)]
+            }
+            blobs.append(entry.body)
+            blobs.append(entry.gzip_body)
+            offset += len(entry.body) + len(entry.gzip_body)
+
+        header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(BUNDLE_MAGIC)
+            f.write(struct.pack('>I', len(header_bytes)))
+            f.write(header_bytes)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read(path):
+        """Read the entries of a bundle file"""
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        if not data.startswith(BUNDLE_MAGIC):
+            raise ValueError('not a lesson bundle')
+
+        start = len(BUNDLE_MAGIC)
+        (header_length,) = struct.unpack('>I', data[start:start + 4])
+        start += 4
+        header = json.loads(data[start:start + header_length].decode('utf-8'))
+        start += header_length
+
+        if header.get('version') != BUNDLE_VERSION:
+            raise ValueError(f"unsupported bundle version {header.get('version')}")
+
+        entries = {}
+        for key, meta in header['entries'].items():
+            body_offset, body_length = meta['body']
+            gzip_offset, gzip_length = meta['gzip_body']
+            entries[key] = PackedResponse(
+                data[start + body_offset:start + body_offset + body_length],
+                data[start + gzip_offset:start + gzip_offset + gzip_length],
+                meta['etag'],
+                meta['source']
+            )
+        return entries
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from services.exercise_index import build_exercise_index
+from services.lesson_graph import LessonGraph
+from services.lesson_search import SearchIndex
+from services.metrics import lesson_load_seconds
+
+
+class LessonCatalog:
+    """Lesson index and full lesson bodies kept in memory
+
+    Lesson files are loaded once at startup. A background thread checks the
+    file modification times and reloads only the files that changed, so
+    lookups never touch the disk.
+    """
+
+    def __init__(self, lessons_dir, poll_interval=2.0):
+        """
+        Initialize lesson catalog
+
+        Args:
+            lessons_dir: Directory containing the lesson JSON files
+            poll_interval: Seconds between file change checks, 0 disables watching
+        """
+        self.lessons_dir = lessons_dir
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._mtimes = {}      # filename -> mtime
+        self._file_ids = {}    # filename -> lesson id
+        self._lessons = {}     # lesson id -> full lesson
+        self._metadata = {}    # lesson id -> metadata
+        self._revisions = {}   # lesson id -> hash of the lesson file
+        self._index = []       # metadata sorted by order
+        self._next_ids = {}    # lesson id -> next lesson id
+        self._exercises = {}   # exercise id -> exercise with test cases
+        self._search = SearchIndex([])
+        self._graph = LessonGraph([])
+        self.index_revision = None
+
+        self.refresh()
+
+        self._stop = threading.Event()
+        self._watcher = None
+        if poll_interval:
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing lesson catalog: {e}")
+
+    def _load_file(self, filename):
+        """Read a lesson file, returning the parsed lesson and a hash of its content"""
+        lesson_file = os.path.join(self.lessons_dir, filename)
+        with open(lesson_file, 'rb') as f:
+            raw = f.read()
+        return json.loads(raw.decode('utf-8')), hashlib.sha256(raw).hexdigest()
+
+    def refresh(self):
+        """
+        Reload lesson files whose modification time changed
+
+        Returns:
+            True if any lesson was added, changed or removed
+        """
+        if not os.path.exists(self.lessons_dir):
+            mtimes = {}
+        else:
+            mtimes = {
+                entry.name: entry.stat().st_mtime
+                for entry in os.scandir(self.lessons_dir)
+                if entry.name.endswith('.json')
+            }
+
+        changed = [name for name, mtime in mtimes.items() if self._mtimes.get(name) != mtime]
+        removed = [name for name in self._mtimes if name not in mtimes]
+
+        if not changed and not removed:
+            return False
+
+        start_time = time.perf_counter()
+
+        # Parse outside the lock so readers are never blocked on file I/O
+        loaded = {}
+        for filename in changed:
+            try:
+                loaded[filename] = self._load_file(filename)
+            except Exception as e:
+                print(f"Error loading lesson file {filename}: {e}")
+
+        with self._lock:
+            for filename in removed + changed:
+                lesson_id = self._file_ids.pop(filename, None)
+                if lesson_id is not None:
+                    self._lessons.pop(lesson_id, None)
+                    self._metadata.pop(lesson_id, None)
+                    self._revisions.pop(lesson_id, None)
+
+            for filename, (lesson_json, revision) in loaded.items():
+                lesson_id = lesson_json.get('id') or filename[:-len('.json')]
+                self._file_ids[filename] = lesson_id
+                self._lessons[lesson_id] = lesson_json
+                self._revisions[lesson_id] = revision
+                self._metadata[lesson_id] = {
+                    'id': lesson_json.get('id'),
+                    'title': lesson_json.get('title'),
+                    'order': lesson_json.get('order', 0),
+                    'description': lesson_json.get('description', ''),
+                    'week': lesson_json.get('week', 0)
+                }
+
+            for filename in removed:
+                self._mtimes.pop(filename, None)
+            for filename in changed:
+                self._mtimes[filename] = mtimes[filename]
+
+            self._rebuild_index()
+
+        lesson_load_seconds.observe(time.perf_counter() - start_time)
+        return True
+
+    def _rebuild_index(self):
+        index = sorted(self._metadata.values(), key=lambda x: x['order'])
+        self._next_ids = {
+            lesson['id']: index[i + 1]['id']
+            for i, lesson in enumerate(index[:-1])
+        }
+        # Changes whenever any lesson file changes, used to version the index
+        revisions = '\n'.join(
+            f"{lesson_id}:{self._revisions[lesson_id]}"
+            for lesson_id in sorted(self._revisions)
+        )
+        self.index_revision = hashlib.sha256(revisions.encode('utf-8')).hexdigest()
+        lessons = [self._lessons[lesson['id']] for lesson in index]
+        self._exercises = build_exercise_index(lessons)
+        self._search = SearchIndex(lessons)
+        self._graph = LessonGraph(lessons)
+        self._index = index
+
+    def get_all_lessons(self):
+        """Get lesson metadata sorted by order"""
+        return list(self._index)
+
+    def get_lesson(self, lesson_id):
+        """Get a lesson with full content"""
+        return self._lessons.get(lesson_id)
+
+    def get_lesson_metadata(self, lesson_id):
+        """Get lesson metadata"""
+        return self._metadata.get(lesson_id)
+
+    def get_exercise(self, exercise_id):
+        """Get an exercise with its lesson id and normalized test cases"""
+        return self._exercises.get(exercise_id)
+
+    def get_revision(self, lesson_id):
+        """Get the content hash of a lesson, None if it does not exist"""
+        return self._revisions.get(lesson_id)
+
+    def get_first_lesson_id(self):
+        """Get the id of the first lesson, None if there are no lessons"""
+        index = self._index
+        return index[0]['id'] if index else None
+
+    def get_next_lesson_id(self, lesson_id):
+        """Get the id of the lesson following lesson_id, None for the last one"""
+        return self._next_ids.get(lesson_id)
+
+    def search(self, query, limit=20):
+        """
+        Search lessons by title, description, section text and example code
+
+        Returns:
+            Metadata of the matching lessons with their score, best match first
+        """
+        metadata = self._metadata
+        return [
+            dict(metadata[lesson_id], score=score)
+            for lesson_id, score in self._search.search(query, limit)
+            if lesson_id in metadata
+        ]
+
+    def get_prerequisites(self, lesson_id):
+        """Get the ids of the lessons lesson_id directly requires"""
+        return self._graph.get_prerequisites(lesson_id)
+
+    def get_dependents(self, lesson_id):
+        """Get the ids of the lessons directly requiring lesson_id"""
+        return self._graph.get_dependents(lesson_id)
+
+    def get_next_lesson(self, lesson_id, completed=None):
+        """
+        Get the id of the lesson to take after lesson_id
+
+        Args:
+            lesson_id: Current lesson
+            completed: Set of lesson ids the user completed, the next lesson
+                is then the first one they haven't completed and can start
+        """
+        return self._graph.get_next(lesson_id, completed)
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        """Stop watching the lesson files"""
+        self._stop.set()
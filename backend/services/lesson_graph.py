@@ -0,0 +1,95 @@
+"""
+Prerequisite graph of the lessons
+
+Lessons run in (week, order) sequence and by default each one requires the
+lesson before it. A lesson file can name its prerequisites explicitly with a
+"prerequisites" list of lesson ids, for lessons that only build on some of
+the earlier ones. Only earlier lessons are accepted as prerequisites, so the
+graph is acyclic by construction and the sequence is a topological order.
+"""
+
+
+def lesson_sort_key(lesson):
+    return (lesson.get('week', 0), lesson.get('order', 0))
+
+
+class LessonGraph:
+    """Prerequisites and dependents of every lesson"""
+
+    def __init__(self, lessons):
+        """
+        Build the graph
+
+        Args:
+            lessons: Full lessons
+        """
+        ordered = sorted(lessons, key=lesson_sort_key)
+        self.order = [lesson.get('id') for lesson in ordered]
+        self._positions = {lesson_id: i for i, lesson_id in enumerate(self.order)}
+        self._prerequisites = {}   # lesson id -> prerequisite ids, in sequence order
+        self._dependents = {}      # lesson id -> ids of lessons requiring it, in sequence order
+
+        for position, lesson in enumerate(ordered):
+            lesson_id = lesson.get('id')
+            required = lesson.get('prerequisites')
+
+            if required is None:
+                prerequisites = [self.order[position - 1]] if position else []
+            else:
+                prerequisites = []
+                for prerequisite_id in required:
+                    if self._positions.get(prerequisite_id, position) >= position:
+                        print(f"Prerequisite {prerequisite_id} of lesson {lesson_id} "
+                              f"is unknown or not an earlier lesson, ignored")
+                    elif prerequisite_id not in prerequisites:
+                        prerequisites.append(prerequisite_id)
+                prerequisites.sort(key=self._positions.get)
+
+            self._prerequisites[lesson_id] = prerequisites
+            self._dependents.setdefault(lesson_id, [])
+            for prerequisite_id in prerequisites:
+                self._dependents[prerequisite_id].append(lesson_id)
+
+    def get_prerequisites(self, lesson_id):
+        """Ids of the lessons lesson_id directly requires"""
+        return list(self._prerequisites.get(lesson_id, []))
+
+    def get_dependents(self, lesson_id):
+        """Ids of the lessons directly requiring lesson_id"""
+        return list(self._dependents.get(lesson_id, []))
+
+    def is_unlocked(self, lesson_id, completed):
+        """True if every prerequisite of lesson_id is in the completed set"""
+        return all(prerequisite_id in completed for prerequisite_id in self._prerequisites.get(lesson_id, []))
+
+    def get_next(self, lesson_id, completed=None):
+        """
+        Get the lesson to take after lesson_id
+
+        Args:
+            lesson_id: Current lesson
+            completed: Set of completed lesson ids. If given, the first
+                unlocked, uncompleted lesson after lesson_id is returned,
+                wrapping around to lessons skipped earlier.
+
+        Returns:
+            Lesson id, None if there is none
+        """
+        position = self._positions.get(lesson_id)
+        if position is None:
+            return None
+
+        if completed is None:
+            dependents = self._dependents[lesson_id]
+            if dependents:
+                return dependents[0]
+            return self.order[position + 1] if position + 1 < len(self.order) else None
+
+        candidates = self.order[position + 1:] + self.order[:position + 1]
+        for candidate_id in candidates:
+            if candidate_id not in completed and self.is_unlocked(candidate_id, completed):
+                return candidate_id
+        return None
+
+    def __len__(self):
+        return len(self.order)
@@ -0,0 +1,153 @@
+"""
+Full-text search over the lessons
+
+An inverted index maps every token of the lesson titles, descriptions,
+section text and example code to the lessons containing it, weighted by the
+field it appears in. Tokens are case and accent folded, so "degisken" finds
+"Değişken". Query terms of three or more characters also match longer
+tokens starting with them, which matters for Turkish suffixes
+("döngü" finds "döngüler"). The sorted vocabulary makes that a bisect
+instead of a scan.
+"""
+
+import bisect
+import math
+import re
+import unicodedata
+
+# Weight of a token occurrence in each field
+FIELD_WEIGHTS = {
+    'title': 5.0,
+    'description': 3.0,
+    'section_title': 2.0,
+    'content': 1.0,
+    'code': 1.0,
+}
+
+# Shorter query terms only match whole tokens
+MIN_PREFIX_LENGTH = 3
+
+# A prefix match counts less than the whole word
+PREFIX_WEIGHT = 0.5
+
+TOKEN = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Case fold and strip accents, dotless ı included"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in text if not unicodedata.combining(char)).replace('ı', 'i')
+
+
+def tokenize(text):
+    """Tokens of a text, snake_case identifiers also yield their parts"""
+    tokens = []
+    for token in TOKEN.findall(normalize(text)):
+        parts = [part for part in token.split('_') if part]
+        if len(parts) > 1:
+            tokens.append(token)
+        tokens.extend(parts)
+    return [token for token in tokens if len(token) > 1]
+
+
+def lesson_fields(lesson):
+    """(field, text) pairs of a lesson"""
+    yield 'title', lesson.get('title') or ''
+    yield 'description', lesson.get('description') or ''
+
+    for section in lesson.get('sections', []):
+        yield 'section_title', section.get('title') or ''
+        yield 'content', section.get('content') or ''
+
+        for example in section.get('examples', []):
+            yield 'section_title', example.get('title') or ''
+            yield 'content', example.get('explanation') or ''
+            yield 'code', example.get('code') or ''
+
+        exercise = section.get('exercise')
+        if exercise:
+            yield 'section_title', exercise.get('title') or ''
+            yield 'content', exercise.get('description') or ''
+            yield 'code', exercise.get('starter_code') or ''
+
+
+class SearchIndex:
+    """Inverted index over a set of lessons, rebuilt whenever they change"""
+
+    def __init__(self, lessons):
+        """
+        Build the index
+
+        Args:
+            lessons: Full lessons in order, equal scores rank the earlier lesson first
+        """
+        # token -> {lesson id: weighted occurrences}
+        self._postings = {}
+        self._positions = {}
+
+        for position, lesson in enumerate(lessons):
+            lesson_id = lesson.get('id')
+            self._positions[lesson_id] = position
+            for field, text in lesson_fields(lesson):
+                weight = FIELD_WEIGHTS[field]
+                for token in tokenize(str(text)):
+                    postings = self._postings.setdefault(token, {})
+                    postings[lesson_id] = postings.get(lesson_id, 0) + weight
+
+        self._vocabulary = sorted(self._postings)
+        self._lesson_count = len(lessons)
+
+    def _term_scores(self, term):
+        """Lesson id -> score of a single query term"""
+        if len(term) < MIN_PREFIX_LENGTH:
+            tokens = [term] if term in self._postings else []
+        else:
+            start = bisect.bisect_left(self._vocabulary, term)
+            end = bisect.bisect_left(self._vocabulary, term + '\uffff', start)
+            tokens = self._vocabulary[start:end]
+
+        scores = {}
+        for token in tokens:
+            postings = self._postings[token]
+            idf = math.log(1 + self._lesson_count / len(postings))
+            factor = idf if token == term else idf * PREFIX_WEIGHT
+            for lesson_id, weight in postings.items():
+                # Diminishing returns for lessons repeating a word
+                score = math.log1p(weight) * factor
+                if score > scores.get(lesson_id, 0):
+                    scores[lesson_id] = score
+        return scores
+
+    def search(self, query, limit=20):
+        """
+        Find lessons matching every term of a query
+
+        Args:
+            query: Search text
+            limit: Maximum number of results
+
+        Returns:
+            List of (lesson id, score), best match first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        totals = None
+        for term in terms:
+            scores = self._term_scores(term)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {
+                    lesson_id: total + scores[lesson_id]
+                    for lesson_id, total in totals.items() if lesson_id in scores
+                }
+            if not totals:
+                return []
+
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], self._positions[item[0]]))
+        return [(lesson_id, round(score, 3)) for lesson_id, score in ranked[:limit]]
+
+    def __len__(self):
+        return len(self._vocabulary)
@@ -0,0 +1,175 @@
+"""
+In-process metrics exposed in the Prometheus text format on /api/metrics
+
+Histograms keep one counter per bucket and label set, so observing a value
+is a bisect and a few increments under a lock. Every server process has its
+own registry.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import ContextDecorator
+
+# Seconds, from sub-millisecond cache hits up to executions hitting the timeout
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class _Timer(ContextDecorator):
+    """Observes the time spent in a with block or a decorated function"""
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self._local = threading.local()
+
+    def __enter__(self):
+        # Per thread, the same timer may decorate a function running on many threads
+        starts = getattr(self._local, 'starts', None)
+        if starts is None:
+            starts = self._local.starts = []
+        starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self._local.starts.pop(), *self.labels)
+        return False
+
+
+class Histogram:
+    """Distribution of observed values in fixed buckets"""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+        self._lock = threading.Lock()
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series = {}
+
+    def observe(self, value, *labels):
+        """Record one value for the given label values"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        """Time a with block or, used as a decorator, every call of a function"""
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+
+        for labels, values in sorted(series.items()):
+            label_text = ','.join(
+                f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)
+            )
+            prefix = label_text + ',' if label_text else ''
+
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+
+            suffix = f'{{{label_text}}}' if label_text else ''
+            lines.append(f'{self.name}_sum{suffix} {values[-1]}')
+            lines.append(f'{self.name}_count{suffix} {cumulative}')
+
+        return lines
+
+
+class Gauge:
+    """Current value read from a callback when metrics are rendered"""
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception as e:
+            print(f"Error reading metric {self.name}: {e}")
+            return []
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge', f'{self.name} {value}']
+
+
+class MetricsRegistry:
+    """Named metrics of the process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, name, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Get or create a histogram"""
+        return self._register(name, lambda: Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, read):
+        """Get or create a gauge whose value comes from read()"""
+        return self._register(name, lambda: Gauge(name, help, read))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REGISTRY = MetricsRegistry()
+
+http_request_seconds = REGISTRY.histogram(
+    'http_request_duration_seconds',
+    'Time spent handling HTTP requests',
+    ('method', 'route', 'status')
+)
+db_query_seconds = REGISTRY.histogram(
+    'db_query_duration_seconds',
+    'Time spent in Database operations, including their commit',
+    ('operation',)
+)
+db_commit_seconds = REGISTRY.histogram(
+    'db_commit_duration_seconds',
+    'Time spent committing write transactions'
+)
+lesson_load_seconds = REGISTRY.histogram(
+    'lesson_load_duration_seconds',
+    'Time spent reloading changed lesson files'
+)
+executor_phase_seconds = REGISTRY.histogram(
+    'executor_phase_duration_seconds',
+    'Time spent validating, compiling and executing submitted code',
+    ('phase',)
+)
+executor_queue_wait_seconds = REGISTRY.histogram(
+    'executor_queue_wait_seconds',
+    'Time executions waited for a free worker process'
+)
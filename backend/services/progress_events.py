@@ -0,0 +1,101 @@
+"""
+Progress events uploaded by clients in batches
+
+Clients record lesson completions locally and upload them to
+/api/progress/sync when they are online. Every event carries an id
+generated by the client, so a batch resent after a dropped connection is
+applied only once. An event looks like:
+
+    {"event_id": "...", "type": "lesson_complete", "lesson_id": "01_intro", "at": 1760000000000}
+
+Exercise passes are not accepted here, they are only recorded when
+/api/exercises/<id>/test grades the code on the server.
+
+"at" is when it happened on the client, in milliseconds since the epoch or
+ISO 8601, so completions made offline keep their order.
+"""
+
+import re
+from datetime import datetime
+
+# Largest batch a client may upload at once
+MAX_EVENTS = 500
+
+EVENT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def event_time(value, now):
+    """
+    Parse the time of an event
+
+    Returns:
+        ISO 8601 local time like datetime.now().isoformat(), times in the
+        future are moved to now, None if value is not a time
+    """
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            moment = datetime.fromtimestamp(value / 1000)
+        elif isinstance(value, str):
+            moment = datetime.fromisoformat(value)
+            if moment.tzinfo is not None:
+                moment = moment.astimezone().replace(tzinfo=None)
+        else:
+            return None
+    except (ValueError, OverflowError, OSError):
+        return None
+
+    return min(moment, now).isoformat()
+
+
+def parse_events(raw_events, catalog):
+    """
+    Check uploaded events against the lesson catalog
+
+    Args:
+        raw_events: Events as sent by the client
+        catalog: LessonCatalog or Database the lesson ids must exist in
+
+    Returns:
+        (events, rejected): valid events as
+        {event_id, type, lesson_id, occurred_at} and the ids
+        (or positions, without a usable id) of the events that are not valid
+    """
+    now = datetime.now()
+    events = []
+    rejected = []
+
+    for position, raw in enumerate(raw_events):
+        event_id = raw.get('event_id') if isinstance(raw, dict) else None
+        if not isinstance(event_id, str) or not EVENT_ID_PATTERN.match(event_id):
+            rejected.append(position)
+            continue
+
+        lesson_id = raw.get('lesson_id')
+        occurred_at = event_time(raw.get('at'), now)
+        valid = (
+            raw.get('type') == 'lesson_complete'
+            and isinstance(lesson_id, str)
+            and catalog.get_lesson_metadata(lesson_id) is not None
+        )
+
+        if not valid or occurred_at is None:
+            rejected.append(event_id)
+            continue
+
+        events.append({
+            'event_id': event_id,
+            'type': 'lesson_complete',
+            'lesson_id': lesson_id,
+            'occurred_at': occurred_at
+        })
+
+    return events, rejected
+
+
+def parse_sync_token(token):
+    """Sync token of the client's last sync, None for a first sync or an unusable token"""
+    try:
+        value = int(token)
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 0 else None
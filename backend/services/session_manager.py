@@ -0,0 +1,272 @@
+import secrets
+import threading
+import time
+from typing import Dict, Any
+
+from database.db import DEFAULT_USER_ID
+from services.worker_pool import _Worker, killed_resources, worker_context
+
+
+class _Session:
+    """A running program and the worker process dedicated to it"""
+
+    def __init__(self, worker, submission=None):
+        self.id = secrets.token_urlsafe(16)
+        self.worker = worker
+        self.lock = threading.Lock()
+        self.waiting = False
+        self.last_active = time.monotonic()
+        # (lesson_id, exercise_id, code, user_id) when the run is recorded
+        self.submission = submission
+        self.output = []
+
+
+class SessionManager:
+    """Interactive executions where input() waits for lines sent by the client
+
+    Every session runs in its own worker process. While the program waits for
+    input the process is blocked reading its pipe, so it uses no CPU and no
+    server thread; a request only holds a thread until the program asks for
+    input or ends. Sessions left waiting longer than idle_timeout are killed.
+    """
+
+    def __init__(self, executor, max_sessions=32, idle_timeout=300, reap_interval=10,
+                 on_finish=None):
+        """
+        Initialize session manager
+
+        Args:
+            executor: CodeExecutor used to validate and compile the code
+            max_sessions: Maximum number of sessions running at the same time
+            idle_timeout: Seconds a session may wait for input before it is killed
+            reap_interval: Seconds between checks for idle sessions
+            on_finish: Optional callback(lesson_id, exercise_id, code, output,
+                success, user_id) for sessions of an exercise that run to the end,
+                like SubmissionSink.submit
+        """
+        self.executor = executor
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.on_finish = on_finish
+
+        self._context = worker_context()
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._closed = False
+
+        self._stop = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        self._reaper.start()
+
+    def _state(self, session_id, parts, result=None) -> Dict[str, Any]:
+        return {
+            'session_id': session_id,
+            'output': ''.join(parts),
+            'waiting_input': result is None,
+            'result': result
+        }
+
+    def _error_result(self, error, execution_time=0):
+        return {
+            'success': False,
+            'output': '',
+            'error': error,
+            'execution_time': execution_time
+        }
+
+    def _killed_result(self, error, start_time):
+        """Result of a stretch whose worker timed out or died before reporting its resources"""
+        result = self._error_result(error, time.time() - start_time)
+        result['resources'] = killed_resources(
+            result['execution_time'],
+            self.executor.timeout,
+            self.executor.cpu_limit,
+            self.executor.memory_limit_mb
+        )
+        return result
+
+    def _end(self, session):
+        with self._lock:
+            self._sessions.pop(session.id, None)
+        session.waiting = False
+        session.worker.kill()
+
+    def _finish(self, session, parts, result) -> Dict[str, Any]:
+        """End a session whose program ended and report its result"""
+        self._end(session)
+
+        if session.submission and self.on_finish:
+            lesson_id, exercise_id, code, user_id = session.submission
+            output = ''.join(session.output) + result.get('output', '')
+            try:
+                self.on_finish(lesson_id, exercise_id, code, output, result.get('success', False), user_id)
+            except Exception as e:
+                print(f"Error recording session {session.id}: {e}")
+
+        return self._state(session.id, parts, result)
+
+    def _advance(self, session) -> Dict[str, Any]:
+        """
+        Collect output until the program asks for input or ends
+
+        The time limit applies to each stretch the program runs, time spent
+        waiting for the user does not count.
+        """
+        start_time = time.time()
+        deadline = time.monotonic() + self.executor.timeout
+        parts = []
+
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not session.worker.conn.poll(remaining):
+                    return self._finish(session, parts, self._killed_result(
+                        f'Execution timed out after {self.executor.timeout} seconds',
+                        start_time
+                    ))
+
+                kind, data = session.worker.conn.recv()
+                if kind == 'output':
+                    parts.append(data)
+                    if session.submission:
+                        session.output.append(data)
+                elif kind == 'input':
+                    session.waiting = True
+                    session.last_active = time.monotonic()
+                    return self._state(session.id, parts)
+                else:
+                    return self._finish(session, parts, data)
+        except (EOFError, OSError):
+            return self._finish(session, parts, self._killed_result(
+                'Execution process crashed',
+                start_time
+            ))
+
+    def start(self, code: str, lesson_id=None, exercise_id=None, user_id=DEFAULT_USER_ID) -> Dict[str, Any]:
+        """
+        Start running code in a new session
+
+        Args:
+            code: Python code to run
+            lesson_id, exercise_id: Exercise the code is for, the finished run
+                is passed to on_finish when both are given
+            user_id: User running the code
+
+        Returns:
+            Session state:
+            {
+                'session_id': str,
+                'output': str,           # output written since the last call
+                'waiting_input': bool,   # True while the program waits for a line
+                'result': dict or None   # same as CodeExecutor.execute once finished
+            }
+        """
+        payload, error_msg = self.executor.prepare_payload(code)
+        if payload is None:
+            return self._state(None, [], self._error_result(error_msg))
+
+        with self._lock:
+            if self._closed:
+                return self._state(None, [], self._error_result('Executor is shut down'))
+            if len(self._sessions) >= self.max_sessions:
+                return self._state(None, [], self._error_result('Server is busy, please try again'))
+
+            session = _Session(_Worker(
+                self._context,
+                self.executor.timeout,
+                self.executor.max_output,
+                self.executor.cpu_limit,
+                self.executor.memory_limit_mb
+            ), (lesson_id, exercise_id, code, user_id) if lesson_id and exercise_id else None)
+            self._sessions[session.id] = session
+
+        with session.lock:
+            try:
+                session.worker.conn.send((payload, [], 'interactive'))
+            except OSError:
+                self._end(session)
+                return self._state(session.id, [], self._error_result('Execution process crashed'))
+            return self._advance(session)
+
+    def send_input(self, session_id: str, line: str):
+        """
+        Send a line to a program waiting in input()
+
+        Returns:
+            Session state like start, None when there is no such waiting session
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            return None
+
+        with session.lock:
+            if not session.waiting:
+                return None
+            session.waiting = False
+
+            try:
+                session.worker.conn.send(str(line))
+            except OSError:
+                self._end(session)
+                return self._state(session.id, [], self._error_result('Execution process crashed'))
+            return self._advance(session)
+
+    def stop(self, session_id: str) -> bool:
+        """Kill a session, returns False when there is no such session"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            return False
+
+        with session.lock:
+            self._end(session)
+        return True
+
+    def reap(self):
+        """Kill sessions that have been waiting for input too long"""
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                session for session in self._sessions.values()
+                if session.waiting and now - session.last_active > self.idle_timeout
+            ]
+
+        for session in idle:
+            # Skip sessions that just received a line
+            if session.lock.acquire(blocking=False):
+                try:
+                    if session.waiting and now - session.last_active > self.idle_timeout:
+                        self._end(session)
+                finally:
+                    session.lock.release()
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Error reaping sessions: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of running sessions"""
+        with self._lock:
+            return {
+                'active': len(self._sessions),
+                'waiting_input': sum(1 for session in self._sessions.values() if session.waiting),
+                'max_sessions': self.max_sessions
+            }
+
+    def close(self):
+        """Kill all sessions and stop the reaper"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+
+        self._stop.set()
+        for session in sessions:
+            session.worker.kill()
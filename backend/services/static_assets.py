@@ -0,0 +1,142 @@
+"""
+Frontend files served from memory
+
+build_assets.py copies the frontend into frontend/dist with a content hash
+in every file name (css/main.3f2a9c1e0b.css), writes gzip and, when the
+brotli package is installed, brotli variants next to each file, rewrites
+the references in index.html and lists everything in manifest.json.
+StaticAssets loads the manifest and all variants once, so serving a file is
+a dictionary lookup and never touches the filesystem.
+
+Without a build, the source files are loaded as they are and compressed in
+memory. They are then revalidated with their ETag instead of cached as
+immutable.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from collections import namedtuple
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Files smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 256
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+# File extension of each precompressed variant
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# A servable file: encoding (None for uncompressed) -> bytes, its type,
+# a strong ETag and whether its name changes with its content
+Asset = namedtuple('Asset', ['bodies', 'content_type', 'etag', 'immutable'])
+
+
+def content_type(path):
+    """Content type of a file, with a charset for text"""
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if mimetype.startswith('text/') or mimetype == 'application/javascript':
+        return mimetype + '; charset=utf-8'
+    return mimetype
+
+
+def compress(body, path):
+    """
+    Compressed variants of a file worth sending instead of the original
+
+    Returns:
+        Dictionary of encoding -> compressed bytes, smaller than body
+    """
+    if len(body) < MIN_COMPRESS_SIZE or not content_type(path).startswith(COMPRESSIBLE_TYPES):
+        return {}
+
+    variants = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+def etag(body):
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+class StaticAssets:
+    """The frontend files, keyed by URL path"""
+
+    def __init__(self, frontend_dir, build_dir=None):
+        """
+        Load the frontend files
+
+        Args:
+            frontend_dir: Source files, used when there is no build
+            build_dir: Output of build_assets.py, ignored if missing or unreadable
+        """
+        self.fingerprinted = False
+        self._assets = {}
+
+        if build_dir and os.path.exists(os.path.join(build_dir, MANIFEST_NAME)):
+            try:
+                self._assets = self._load_build(build_dir)
+                self.fingerprinted = True
+            except Exception as e:
+                print(f"Error loading frontend build {build_dir}: {e}")
+
+        if not self._assets:
+            self._assets = self._load_sources(frontend_dir, skip=build_dir)
+
+        self.index = self._assets.get('/index.html')
+
+    @staticmethod
+    def _load_build(build_dir):
+        with open(os.path.join(build_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"unsupported manifest version {manifest.get('version')}")
+
+        assets = {}
+        for url_path, meta in manifest['files'].items():
+            file_path = os.path.join(build_dir, *url_path.lstrip('/').split('/'))
+            bodies = {}
+            for encoding in [None] + meta['encodings']:
+                with open(file_path + ENCODING_SUFFIXES.get(encoding, ''), 'rb') as f:
+                    bodies[encoding] = f.read()
+            assets[url_path] = Asset(bodies, content_type(url_path), meta['etag'], meta['immutable'])
+        return assets
+
+    @staticmethod
+    def _load_sources(frontend_dir, skip=None):
+        skip = os.path.abspath(skip) if skip else None
+        assets = {}
+
+        for root, dirs, files in os.walk(frontend_dir):
+            dirs[:] = [
+                name for name in dirs
+                if not (skip and os.path.abspath(os.path.join(root, name)).startswith(skip))
+            ]
+            for name in files:
+                file_path = os.path.join(root, name)
+                url_path = '/' + os.path.relpath(file_path, frontend_dir).replace(os.sep, '/')
+                with open(file_path, 'rb') as f:
+                    body = f.read()
+
+                bodies = {None: body}
+                bodies.update(compress(body, url_path))
+                assets[url_path] = Asset(bodies, content_type(url_path), etag(body), False)
+        return assets
+
+    def get(self, url_path):
+        """Get the file at a URL path like /css/main.css, None if there is none"""
+        return self._assets.get(url_path)
+
+    def __len__(self):
+        return len(self._assets)
@@ -0,0 +1,686 @@
+import asyncio
+import marshal
+import math
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from typing import Dict, Any
+
+from services.metrics import executor_phase_seconds, executor_queue_wait_seconds
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def worker_context():
+    """Multiprocessing context used to start worker processes"""
+    # Forked workers start with every module already imported
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('spawn')
+
+
+def killed_resources(execution_time, timeout, cpu_limit, memory_limit_mb):
+    """
+    Resources of a run whose worker was killed or died
+
+    Only the wall time is known, the other usage fields are None. The limits
+    the run was under are added, a timed out run has reached one of them.
+    """
+    return {
+        'cpu_ms': None,
+        'wall_ms': round(execution_time * 1000, 3),
+        'peak_rss_kb': None,
+        'output_bytes': None,
+        'timeout_s': timeout,
+        'cpu_limit_s': cpu_limit,
+        'memory_limit_mb': memory_limit_mb
+    }
+
+
+class _OutputSender:
+    """Sends streamed output to the parent, coalescing small writes
+
+    Output still buffered interval seconds after it was written is sent by a
+    flusher thread, started with the first write that is held back, so a
+    line is never kept waiting for the next write.
+    """
+
+    def __init__(self, conn, interval=0.05, max_buffer=4096):
+        self.conn = conn
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self._parts = []
+        self._size = 0
+        self._last_send = 0
+        self._first_write = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def write(self, text):
+        with self._cond:
+            self._parts.append(text)
+            self._size += len(text)
+
+            # A line after a quiet period goes out at once, bursts are batched
+            if self._size >= self.max_buffer or (
+                    text.endswith('\n') and time.monotonic() - self._last_send >= self.interval):
+                self._send()
+            elif self._first_write is None:
+                self._first_write = time.monotonic()
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+                self._cond.notify()
+
+    def flush(self):
+        with self._cond:
+            self._send()
+
+    def _send(self):
+        if self._parts:
+            # Blocks while the pipe is full, so a slow client slows the program down
+            self.conn.send(('output', ''.join(self._parts)))
+            self._parts = []
+            self._size = 0
+        self._first_write = None
+        self._last_send = time.monotonic()
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                if self._first_write is None:
+                    self._cond.wait()
+                    continue
+
+                remaining = self._first_write + self.interval - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+
+                try:
+                    self._send()
+                except (OSError, ValueError):
+                    # The parent is gone, the program's next write finds out too
+                    return
+
+    def close(self):
+        """Send what is left and stop the flusher thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            self._send()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def _limit_memory(memory_limit_mb):
+    """Cap the address space of the worker at its current size plus the limit"""
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        # Without /proc the current size is unknown, and RLIMIT_AS is not
+        # enforced on macOS anyway
+        return
+
+    limit = current + memory_limit_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _limit_cpu(cpu_limit):
+    """Allow cpu_limit more seconds of CPU time from now"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = math.ceil(usage.ru_utime + usage.ru_stime)
+    # Only the soft limit moves, an unprivileged process can't raise the hard one
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + cpu_limit
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _worker_main(conn, timeout, max_output, cpu_limit, memory_limit_mb):
+    """Worker process loop: run jobs received over the pipe until told to stop"""
+    # Ctrl+C is handled by the parent, workers are shut down through the pipe
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from services.code_executor import CodeExecutor, CpuLimitExceeded, ExecutionCancelled
+
+    # Building the executor here warms up the safe builtins before the first job
+    executor = CodeExecutor(
+        timeout=timeout,
+        max_output=max_output,
+        cpu_limit=cpu_limit,
+        memory_limit_mb=memory_limit_mb
+    )
+
+    if resource is not None:
+        def cpu_exceeded(signum, frame):
+            raise CpuLimitExceeded()
+
+        # SIGXCPU is sent when the soft CPU limit is reached
+        signal.signal(signal.SIGXCPU, cpu_exceeded)
+        _limit_memory(memory_limit_mb)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        if job is None:
+            break
+
+        payload, inputs, mode = job
+        if resource is not None:
+            _limit_cpu(cpu_limit)
+
+        if mode == 'result':
+            conn.send(executor.run_compiled(marshal.loads(payload), inputs))
+            continue
+
+        sender = _OutputSender(conn)
+
+        def read_line():
+            # Blocks in recv, a paused program uses no CPU until the line arrives
+            sender.flush()
+            conn.send(('input', None))
+            line = conn.recv()
+            if line is None:
+                raise ExecutionCancelled()
+            return line
+
+        result = executor.run_compiled(
+            marshal.loads(payload),
+            inputs,
+            on_output=sender.write,
+            on_input=read_line if mode == 'interactive' else None
+        )
+        sender.close()
+        conn.send(('result', result))
+
+    conn.close()
+
+
+class _Worker:
+    """A single worker process and the parent end of its pipe
+
+    Jobs are (payload, inputs, mode) tuples. Mode 'result' answers with the
+    result dict, 'stream' sends ('output', text) messages followed by
+    ('result', dict), and 'interactive' additionally sends ('input', None)
+    whenever the program waits for a line from the parent.
+    """
+
+    def __init__(self, context, timeout, max_output, cpu_limit, memory_limit_mb):
+        parent_conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, timeout, max_output, cpu_limit, memory_limit_mb),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def stop(self):
+        """Ask the worker to exit, killing it if it does not"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+    def kill(self):
+        """Hard-kill the worker process"""
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """Pool of pre-forked processes that execute user code with a hard deadline"""
+
+    def __init__(self, size=4, timeout=5, max_output=10000, max_queue=None, queue_timeout=10,
+                 cpu_limit=5, memory_limit_mb=256, recycle_rss_mb=192):
+        """
+        Initialize worker pool
+
+        Args:
+            size: Number of worker processes
+            timeout: Maximum execution time in seconds, the worker is killed after it
+            max_output: Maximum output length in characters
+            max_queue: Maximum number of requests waiting for a free worker
+            queue_timeout: Maximum time in seconds a request waits for a free worker
+            cpu_limit: Maximum CPU time in seconds per execution
+            memory_limit_mb: Memory a worker may allocate on top of its startup size
+            recycle_rss_mb: Peak resident memory after which a worker is replaced
+        """
+        self.size = size
+        self.timeout = timeout
+        self.max_output = max_output
+        self.cpu_limit = cpu_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.recycle_rss_kb = recycle_rss_mb * 1024
+        self.max_queue = max_queue if max_queue is not None else size * 8
+        self.queue_timeout = queue_timeout
+
+        self._context = worker_context()
+
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._closed = False
+        self._workers = []
+        self._idle = queue.Queue()
+        self._async_waiters = deque()
+
+        for _ in range(size):
+            worker = self._spawn()
+            self._workers.append(worker)
+            self._idle.put(worker)
+
+    def _spawn(self):
+        return _Worker(self._context, self.timeout, self.max_output, self.cpu_limit, self.memory_limit_mb)
+
+    def _respawn(self, worker):
+        """Replace a dead or stuck worker with a fresh one"""
+        worker.kill()
+        replacement = self._spawn()
+        with self._lock:
+            self._workers[self._workers.index(worker)] = replacement
+        return replacement
+
+    def _respawn_later(self, worker):
+        """
+        Replace a worker on a thread, then release the new one into the pool
+
+        For the event loop paths: killing and forking block, and a cancelled
+        request can't wait for them.
+        """
+        def replace():
+            try:
+                replacement = self._respawn(worker)
+            except Exception as e:
+                print(f"Error replacing worker: {e}")
+                return
+            if self._closed:
+                replacement.stop()
+            else:
+                self._release(replacement)
+
+        threading.Thread(target=replace, daemon=True).start()
+
+    def _after_run(self, worker, result, later=False):
+        """
+        Record a finished run and replace the worker if its memory has grown
+
+        With later set the worker is replaced by _respawn_later, and None is
+        returned in its place.
+        """
+        if 'execution_time' in result:
+            executor_phase_seconds.observe(result['execution_time'], 'exec')
+
+        # Memory freed by the program is not returned to the OS
+        if result.get('resources', {}).get('peak_rss_kb', 0) > self.recycle_rss_kb:
+            if later:
+                self._respawn_later(worker)
+                return None
+            return self._respawn(worker)
+        return worker
+
+    def _error_result(self, error, execution_time=0):
+        return {
+            'success': False,
+            'output': '',
+            'error': error,
+            'execution_time': execution_time
+        }
+
+    def _killed_result(self, error, start_time):
+        """Result of a run whose worker timed out or died before reporting its resources"""
+        result = self._error_result(error, time.time() - start_time)
+        result['resources'] = killed_resources(
+            result['execution_time'], self.timeout, self.cpu_limit, self.memory_limit_mb
+        )
+        return result
+
+    def _enter_queue(self):
+        """
+        Reserve a place in the wait queue
+
+        Returns:
+            Error result when the request is refused, None otherwise
+        """
+        # Backpressure: refuse new work when too many requests are already waiting
+        with self._lock:
+            if self._closed:
+                return self._error_result('Executor is shut down')
+            if self._waiting >= self.max_queue:
+                return self._error_result('Server is busy, please try again')
+            self._waiting += 1
+        return None
+
+    def _leave_queue(self):
+        with self._lock:
+            self._waiting -= 1
+
+    def _release(self, worker):
+        """Give a worker to the next async waiter, or back to the idle queue"""
+        with self._lock:
+            while self._async_waiters:
+                loop, future = self._async_waiters.popleft()
+                if not future.done():
+                    loop.call_soon_threadsafe(self._hand_over, future, worker)
+                    return
+        self._idle.put(worker)
+
+    def _hand_over(self, future, worker):
+        # Runs on the waiter's event loop, the waiter may have timed out meanwhile
+        if future.done():
+            self._release(worker)
+        else:
+            future.set_result(worker)
+
+    def _send_job(self, worker, payload, inputs, mode='result'):
+        worker.conn.send((payload, list(inputs) if inputs else [], mode))
+
+    def execute(self, payload: bytes, inputs: list = None) -> Dict[str, Any]:
+        """
+        Run compiled code on a free worker
+
+        Args:
+            payload: Code object serialized with marshal
+            inputs: List of inputs for input() calls
+
+        Returns:
+            Same dictionary as CodeExecutor.execute
+        """
+        refused = self._enter_queue()
+        if refused:
+            return refused
+
+        wait_start = time.perf_counter()
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+            executor_queue_wait_seconds.observe(time.perf_counter() - wait_start)
+        except queue.Empty:
+            return self._error_result('Server is busy, please try again')
+        finally:
+            self._leave_queue()
+
+        start_time = time.time()
+
+        try:
+            self._send_job(worker, payload, inputs)
+
+            if worker.conn.poll(self.timeout):
+                result = worker.conn.recv()
+                worker = self._after_run(worker, result)
+                return result
+
+            # Deadline passed: the worker may be stuck in an endless loop
+            worker = self._respawn(worker)
+            return self._killed_result(
+                f'Execution timed out after {self.timeout} seconds',
+                start_time
+            )
+        except (EOFError, OSError):
+            # The worker died while running the code
+            worker = self._respawn(worker)
+            return self._killed_result(
+                'Execution process crashed',
+                start_time
+            )
+        finally:
+            self._release(worker)
+
+    def execute_stream(self, payload: bytes, inputs: list = None):
+        """
+        Run compiled code on a free worker, yielding output while it runs
+
+        Args:
+            payload: Code object serialized with marshal
+            inputs: List of inputs for input() calls
+
+        Yields:
+            ('output', text) events, then a single ('result', dict) event.
+            The result holds only output that was not streamed before it.
+        """
+        refused = self._enter_queue()
+        if refused:
+            yield 'result', refused
+            return
+
+        wait_start = time.perf_counter()
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+            executor_queue_wait_seconds.observe(time.perf_counter() - wait_start)
+        except queue.Empty:
+            yield 'result', self._error_result('Server is busy, please try again')
+            return
+        finally:
+            self._leave_queue()
+
+        start_time = time.time()
+        deadline = start_time + self.timeout
+        finished = False
+
+        try:
+            self._send_job(worker, payload, inputs, mode='stream')
+
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not worker.conn.poll(remaining):
+                    worker = self._respawn(worker)
+                    finished = True
+                    yield 'result', self._killed_result(
+                        f'Execution timed out after {self.timeout} seconds',
+                        start_time
+                    )
+                    return
+
+                event = worker.conn.recv()
+                if event[0] == 'result':
+                    finished = True
+                    worker = self._after_run(worker, event[1])
+                yield event
+                if finished:
+                    return
+        except (EOFError, OSError):
+            worker = self._respawn(worker)
+            finished = True
+            yield 'result', self._killed_result(
+                'Execution process crashed',
+                start_time
+            )
+        finally:
+            # The consumer stopped reading mid-run, the rest of the output must not
+            # reach the next job
+            if not finished:
+                worker = self._respawn(worker)
+            self._release(worker)
+
+    async def _acquire_async(self):
+        """Wait for a free worker without blocking a thread"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._async_waiters.append((loop, future))
+
+        # A worker may have been released between the check and the registration
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return await asyncio.wait_for(future, self.queue_timeout)
+            except BaseException:
+                # Don't lose a worker handed over just as the wait was given up
+                if future.done() and not future.cancelled():
+                    self._release(future.result())
+                raise
+
+        future.cancel()
+        return worker
+
+    async def _wait_readable(self, conn, timeout):
+        """Wait until the worker has sent its result, without holding a thread"""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+
+        try:
+            loop.add_reader(conn.fileno(), lambda: ready.done() or ready.set_result(True))
+        except NotImplementedError:
+            # Event loops without reader support (Windows) fall back to a thread
+            return await loop.run_in_executor(None, conn.poll, timeout)
+
+        try:
+            await asyncio.wait_for(ready, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(conn.fileno())
+
+    async def execute_async(self, payload: bytes, inputs: list = None) -> Dict[str, Any]:
+        """
+        Run compiled code on a free worker from an event loop
+
+        Same as execute, but waiting for a worker and for the result
+        does not hold an OS thread.
+        """
+        refused = self._enter_queue()
+        if refused:
+            return refused
+
+        wait_start = time.perf_counter()
+        try:
+            worker = await self._acquire_async()
+            executor_queue_wait_seconds.observe(time.perf_counter() - wait_start)
+        except asyncio.TimeoutError:
+            return self._error_result('Server is busy, please try again')
+        finally:
+            self._leave_queue()
+
+        start_time = time.time()
+
+        try:
+            self._send_job(worker, payload, inputs)
+
+            if await self._wait_readable(worker.conn, self.timeout):
+                result = worker.conn.recv()
+                worker = self._after_run(worker, result, later=True)
+                return result
+
+            self._respawn_later(worker)
+            worker = None
+            return self._killed_result(
+                f'Execution timed out after {self.timeout} seconds',
+                start_time
+            )
+        except (EOFError, OSError):
+            self._respawn_later(worker)
+            worker = None
+            return self._killed_result(
+                'Execution process crashed',
+                start_time
+            )
+        except asyncio.CancelledError:
+            # Client went away mid-run, the worker's result would be read by the next job
+            self._respawn_later(worker)
+            worker = None
+            raise
+        finally:
+            # A replaced worker is released by _respawn_later
+            if worker is not None:
+                self._release(worker)
+
+    async def execute_stream_async(self, payload: bytes, inputs: list = None):
+        """
+        Run compiled code on a free worker from an event loop, yielding output
+
+        Same events as execute_stream, without holding a thread.
+        """
+        refused = self._enter_queue()
+        if refused:
+            yield 'result', refused
+            return
+
+        wait_start = time.perf_counter()
+        try:
+            worker = await self._acquire_async()
+            executor_queue_wait_seconds.observe(time.perf_counter() - wait_start)
+        except asyncio.TimeoutError:
+            yield 'result', self._error_result('Server is busy, please try again')
+            return
+        finally:
+            self._leave_queue()
+
+        start_time = time.time()
+        deadline = start_time + self.timeout
+        finished = False
+
+        try:
+            self._send_job(worker, payload, inputs, mode='stream')
+
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not await self._wait_readable(worker.conn, remaining):
+                    self._respawn_later(worker)
+                    worker = None
+                    finished = True
+                    yield 'result', self._killed_result(
+                        f'Execution timed out after {self.timeout} seconds',
+                        start_time
+                    )
+                    return
+
+                event = worker.conn.recv()
+                if event[0] == 'result':
+                    finished = True
+                    worker = self._after_run(worker, event[1], later=True)
+                yield event
+                if finished:
+                    return
+        except (EOFError, OSError):
+            self._respawn_later(worker)
+            worker = None
+            finished = True
+            yield 'result', self._killed_result(
+                'Execution process crashed',
+                start_time
+            )
+        finally:
+            # Also covers cancellation and the client going away mid-run
+            if not finished:
+                self._respawn_later(worker)
+            elif worker is not None:
+                self._release(worker)
+
+    def close(self):
+        """Stop all worker processes"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,28 @@
+import asyncio
+import json
+
+import pytest
+
+import asgi
+
+
+async def post(path, body):
+    """POST a raw body to the ASGI app, returns (status, JSON response)"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi.app({'type': 'http', 'method': 'POST', 'path': path, 'headers': []}, receive, send)
+    return messages[0]['status'], json.loads(messages[1]['body'])
+
+
+@pytest.mark.parametrize('path', ['/api/execute', '/api/execute/stream', '/api/exercises/ex_01/test'])
+@pytest.mark.parametrize('body', [b'[1]', b'"print(1)"'])
+def test_body_that_is_not_an_object_is_rejected(path, body):
+    status, response = asyncio.run(post(path, body))
+    assert status == 400
+    assert response == {'success': False, 'error': 'Request body must be a JSON object'}
@@ -0,0 +1,37 @@
+import types
+
+from services import batch_grader
+from services.batch_grader import BatchGrader
+from services.code_executor import CodeExecutor
+
+
+class FakeDatabase:
+    """One batch of submissions for a single exercise"""
+
+    def __init__(self):
+        self.grades = []
+
+    def iter_code_submissions(self, lesson_id, exercise_id, batch_size):
+        yield [(1, 'ex_01', 'print(1)'), (2, 'ex_01', 'print(2)')]
+
+    def get_exercise(self, exercise_id):
+        return {'lesson_id': '01_intro', 'test_cases': [{'input': [], 'expected_output': '1'}]}
+
+    def save_grades(self, rows):
+        self.grades.extend(rows)
+
+
+def test_regrade_survives_a_clock_that_did_not_move(monkeypatch):
+    monkeypatch.setattr(batch_grader, 'time', types.SimpleNamespace(time=lambda: 1000.0))
+    executor = CodeExecutor(workers=0)
+    db = FakeDatabase()
+    try:
+        stats = BatchGrader(db, executor, concurrency=1).grade()
+    finally:
+        executor.close()
+
+    assert stats['submissions'] == 2
+    assert stats['passed'] == 1
+    assert stats['seconds'] == 0
+    assert stats['submissions_per_second'] == 0
+    assert len(db.grades) == 2
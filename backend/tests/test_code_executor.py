@@ -0,0 +1,92 @@
+import pytest
+
+from services.code_executor import CodeExecutor
+
+FRAME_ESCAPE = '''
+def g():
+    yield g_.gi_frame.f_back.f_back
+g_ = g()
+for f in g_:
+    break
+print(f.f_globals['os'].getcwd())
+'''
+
+FORMAT_FRAME_ESCAPE = '''
+def g():
+    yield '{0.gi_frame.f_back.f_back.f_globals[os].environ[ADMIN_TOKEN]}'.format(g_)
+g_ = g()
+for s in g_:
+    print(s)
+'''
+
+FORMAT_DUNDER_ESCAPE = "print(('{0._' + '_class_' + '_._' + '_mro_' + '_}').format(1))"
+
+
+@pytest.fixture(scope='module')
+def executor():
+    executor = CodeExecutor(workers=0)
+    yield executor
+    executor.close()
+
+
+def test_frame_escape_is_rejected(executor):
+    is_valid, error = executor.validate_code(FRAME_ESCAPE)
+    assert not is_valid
+    assert error.startswith('Forbidden attribute')
+
+    result = executor.execute(FRAME_ESCAPE)
+    assert not result['success']
+    assert result['output'] == ''
+
+
+@pytest.mark.parametrize('code', [FORMAT_FRAME_ESCAPE, FORMAT_DUNDER_ESCAPE], ids=['frame', 'dunder'])
+def test_format_attribute_lookups_are_rejected(executor, code):
+    is_valid, error = executor.validate_code(code)
+    assert not is_valid
+    assert error == 'Forbidden attribute detected: format'
+
+    result = executor.execute(code)
+    assert not result['success']
+    assert result['output'] == ''
+
+
+@pytest.mark.parametrize('attribute', sorted(CodeExecutor.FORBIDDEN_ATTRIBUTES))
+def test_frame_attributes_are_rejected(executor, attribute):
+    is_valid, error = executor.validate_code(f'x = None\nprint(x.{attribute})')
+    assert not is_valid
+    assert attribute in error
+
+
+def test_generators_still_run(executor):
+    code = 'def squares(n):\n    for i in range(n):\n        yield i * i\nprint(list(squares(4)))'
+    result = executor.execute(code)
+    assert result['success']
+    assert result['output'].strip() == '[0, 1, 4, 9]'
+
+
+def test_grading_cache_keeps_trailing_whitespace_in_strings(executor):
+    test_cases = [{'input': [], 'expected_output': 'a \nb'}]
+    with_space = 'print("""a \nb""")'
+    without_space = 'print("""a\nb""")'
+
+    assert executor.run_tests(with_space, test_cases)['success']
+    assert not executor.run_tests(without_space, test_cases)['success']
+
+
+def test_lone_surrogate_gives_an_error_result(executor):
+    result = executor.execute('print("\ud800")')
+    assert not result['success']
+    assert result['error']
+
+
+def test_timed_out_grades_are_not_cached():
+    executor = CodeExecutor(workers=1, timeout=0.5)
+    test_cases = [{'input': [], 'expected_output': ''}]
+    try:
+        executor.run_tests('while True:\n    pass', test_cases)
+        executor.run_tests('while True:\n    pass', test_cases)
+        stats = executor.grading_cache_stats()
+    finally:
+        executor.close()
+
+    assert stats['hits'] == 0
@@ -0,0 +1,30 @@
+import sqlite3
+
+import pytest
+
+from database.connection import ConnectionManager
+
+
+def test_failed_commit_leaves_no_open_transaction(tmp_path):
+    connections = ConnectionManager(str(tmp_path / 'test.db'))
+    conn = connections.connection()
+    conn.execute('PRAGMA foreign_keys=ON')
+    conn.execute('CREATE TABLE parent (id INTEGER PRIMARY KEY)')
+    conn.execute('''
+        CREATE TABLE child (
+            parent_id INTEGER REFERENCES parent (id) DEFERRABLE INITIALLY DEFERRED
+        )
+    ''')
+
+    # A deferred foreign key is only checked by COMMIT, which then fails
+    with pytest.raises(sqlite3.IntegrityError):
+        with connections.transaction() as conn:
+            conn.execute('INSERT INTO child VALUES (1)')
+
+    assert not conn.in_transaction
+    with connections.transaction() as conn:
+        conn.execute('INSERT INTO parent VALUES (1)')
+        conn.execute('INSERT INTO child VALUES (1)')
+    assert conn.execute('SELECT COUNT(*) FROM child').fetchone()[0] == 1
+
+    connections.close_all()
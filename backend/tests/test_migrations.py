@@ -0,0 +1,30 @@
+import sqlite3
+
+from database.db import Database
+
+
+def test_v2_keeps_the_code_of_the_latest_duplicate():
+    conn = sqlite3.connect(':memory:')
+    db = Database.__new__(Database)
+    db._migrate_v1(conn)
+    conn.executemany('''
+        INSERT INTO user_progress (lesson_id, exercise_id, completed, last_code, test_passed, completed_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        ('01_intro', 'ex_01', False, 'zzz_first', False, '2025-01-01T10:00:00'),
+        ('01_intro', 'ex_01', False, 'aaa_latest', True, '2025-01-02T10:00:00'),
+        ('01_intro', 'ex_01', False, None, False, '2025-01-03T10:00:00'),
+        ('02_vars', None, True, 'zzz_first', False, None),
+        ('02_vars', None, True, 'aaa_latest', False, None),
+    ])
+
+    db._migrate_v2(conn)
+
+    rows = conn.execute('''
+        SELECT lesson_id, exercise_id, last_code, test_passed, completed_at
+        FROM user_progress ORDER BY lesson_id
+    ''').fetchall()
+    assert rows == [
+        ('01_intro', 'ex_01', 'aaa_latest', 1, '2025-01-03T10:00:00'),
+        ('02_vars', '', 'aaa_latest', 0, None),
+    ]
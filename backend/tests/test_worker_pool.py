@@ -0,0 +1,107 @@
+import asyncio
+import contextlib
+import json
+import time
+
+import asgi
+from services.code_executor import CodeExecutor
+from services.worker_pool import _Worker
+
+
+async def get_health():
+    """Request /api/health from the native handler"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/health', 'headers': []}
+    await asgi.app(scope, receive, send)
+    return messages
+
+
+def test_cancelled_run_does_not_block_the_event_loop(monkeypatch):
+    kill = _Worker.kill
+
+    def slow_kill(worker):
+        time.sleep(0.5)
+        kill(worker)
+
+    async def main():
+        executor = CodeExecutor(workers=1, timeout=5)
+        try:
+            # Killing the endless loop now stands for a slow kill and fork
+            monkeypatch.setattr(_Worker, 'kill', slow_kill)
+            task = asyncio.ensure_future(executor.execute_async('while True:\n    pass'))
+            await asyncio.sleep(0.2)
+
+            # Cleanup runs on the loop when the task is cancelled, as the client goes away
+            start = time.perf_counter()
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            messages = await get_health()
+            assert time.perf_counter() - start < 0.2
+            assert messages[0]['status'] == 200
+            assert json.loads(messages[1]['body'])['status'] == 'healthy'
+
+            # The replacement worker comes back to the pool
+            result = await asyncio.wait_for(executor.execute_async('print(1)'), 5)
+            assert result['output'] == '1\n'
+        finally:
+            monkeypatch.setattr(_Worker, 'kill', kill)
+            executor.close()
+
+    asyncio.run(main())
+
+
+def test_abandoned_stream_does_not_block_the_event_loop(monkeypatch):
+    kill = _Worker.kill
+
+    def slow_kill(worker):
+        time.sleep(0.5)
+        kill(worker)
+
+    async def main():
+        executor = CodeExecutor(workers=1, timeout=5)
+        try:
+            monkeypatch.setattr(_Worker, 'kill', slow_kill)
+            payload, _ = executor.prepare_payload('print(1)\nwhile True:\n    pass')
+            events = executor._pool.execute_stream_async(payload)
+            assert await events.__anext__() == ('output', '1\n')
+
+            # The client stops reading mid-run
+            start = time.perf_counter()
+            await events.aclose()
+            messages = await get_health()
+            assert time.perf_counter() - start < 0.2
+            assert messages[0]['status'] == 200
+
+            result = await asyncio.wait_for(executor.execute_async('print(2)'), 5)
+            assert result['output'] == '2\n'
+        finally:
+            monkeypatch.setattr(_Worker, 'kill', kill)
+            executor.close()
+
+    asyncio.run(main())
+
+
+def test_timed_out_run_reports_wall_time_and_limits():
+    executor = CodeExecutor(workers=1, timeout=0.5)
+    try:
+        result = executor.execute('while True:\n    pass')
+        async_result = asyncio.run(executor.execute_async('while True:\n    pass'))
+    finally:
+        executor.close()
+
+    for run in (result, async_result):
+        assert run['error'] == 'Execution timed out after 0.5 seconds'
+        resources = run['resources']
+        assert resources['wall_ms'] >= 500
+        assert resources['cpu_ms'] is None
+        assert resources['timeout_s'] == 0.5
+        assert resources['memory_limit_mb'] == executor.memory_limit_mb
+        assert set(resources) >= {'cpu_ms', 'wall_ms', 'peak_rss_kb', 'output_bytes'}
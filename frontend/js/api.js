@@ -13,12 +13,35 @@ class API {
         }
         this.baseURL = baseURL;
         this.apiURL = `${baseURL}/api`;
+        this.userId = this.loadUserId();
+    }
+
+    /**
+     * Get the id this browser uses for progress, creating it on first use
+     */
+    loadUserId() {
+        const storageKey = 'py-learning-user-id';
+        let userId = localStorage.getItem(storageKey);
+        if (!userId) {
+            userId = window.crypto && crypto.randomUUID
+                ? crypto.randomUUID()
+                : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+            localStorage.setItem(storageKey, userId);
+        }
+        return userId;
+    }
+
+    /**
+     * Request headers sent with every API call
+     */
+    headers(extra = {}) {
+        return { 'X-User-Id': this.userId, ...extra };
     }
 
     // ==================== Lessons ====================
     async getLessons() {
         try {
-            const response = await fetch(`${this.apiURL}/lessons`);
+            const response = await fetch(`${this.apiURL}/lessons`, { headers: this.headers() });
             const data = await response.json();
             if (!response.ok) throw new Error(data.error || 'Failed to load lessons');
             return data;
@@ -30,7 +53,7 @@ class API {
 
     async getLesson(lessonId) {
         try {
-            const response = await fetch(`${this.apiURL}/lessons/${lessonId}`);
+            const response = await fetch(`${this.apiURL}/lessons/${lessonId}`, { headers: this.headers() });
             const data = await response.json();
             if (!response.ok) throw new Error(data.error || 'Failed to load lesson');
             return data;
@@ -44,7 +67,7 @@ class API {
         try {
             const response = await fetch(`${this.apiURL}/lessons/${lessonId}/complete`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' }
+                headers: this.headers({ 'Content-Type': 'application/json' })
             });
             const data = await response.json();
             if (!response.ok) throw new Error(data.error || 'Failed to complete lesson');
@@ -55,12 +78,43 @@ class API {
         }
     }
 
+    async searchLessons(query, limit = 20) {
+        try {
+            const params = new URLSearchParams({ q: query, limit });
+            const response = await fetch(`${this.apiURL}/lessons/search?${params}`, { headers: this.headers() });
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || 'Failed to search lessons');
+            return data;
+        } catch (error) {
+            console.error('Error searching lessons:', error);
+            throw error;
+        }
+    }
+
+    /**
+     * Get the lesson to take after lessonId, skipping lessons already
+     * completed or still missing a prerequisite
+     */
+    async getNextLesson(lessonId) {
+        try {
+            const response = await fetch(`${this.apiURL}/lessons/${lessonId}/next?include=progress`, {
+                headers: this.headers()
+            });
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || 'Failed to load next lesson');
+            return data;
+        } catch (error) {
+            console.error(`Error fetching next lesson of ${lessonId}:`, error);
+            throw error;
+        }
+    }
+
     // ==================== Code Execution ====================
     async executeCode(code, lessonId = null, exerciseId = null) {
         try {
             const response = await fetch(`${this.apiURL}/execute`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: this.headers({ 'Content-Type': 'application/json' }),
                 body: JSON.stringify({
                     code,
                     lesson_id: lessonId,
@@ -76,18 +130,134 @@ class API {
         }
     }
 
-    async testExercise(exerciseId, code, testCases, lessonId = null) {
+    /**
+     * Execute code, calling onOutput with each chunk of output as it arrives
+     * Resolves with the final execution result
+     */
+    async executeCodeStream(code, lessonId = null, exerciseId = null, onOutput = () => {}) {
         try {
-            const response = await fetch(`${this.apiURL}/exercises/${exerciseId}/test`, {
+            const response = await fetch(`${this.apiURL}/execute/stream`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: this.headers({
+                    'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream'
+                }),
                 body: JSON.stringify({
                     code,
-                    test_cases: testCases,
-                    lesson_id: lessonId
+                    lesson_id: lessonId,
+                    exercise_id: exerciseId
+                })
+            });
+            if (!response.ok) {
+                const data = await response.json();
+                throw new Error(data.error || 'Failed to execute code');
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let result = null;
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // Events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const event = this.parseEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+
+                    if (event.type === 'output') {
+                        onOutput(event.data.text);
+                    } else if (event.type === 'result') {
+                        result = event.data;
+                    }
+                }
+            }
+
+            if (!result) throw new Error('Execution ended without a result');
+            return result;
+        } catch (error) {
+            console.error('Error executing code:', error);
+            throw error;
+        }
+    }
+
+    /**
+     * Parse one Server-Sent Event with a JSON payload
+     */
+    parseEvent(message) {
+        let type = 'message';
+        const data = [];
+        message.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                type = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data.push(line.slice(5).trim());
+            }
+        });
+        return { type, data: data.length ? JSON.parse(data.join('\n')) : null };
+    }
+
+    // ==================== Interactive Sessions ====================
+    async startSession(code, lessonId = null, exerciseId = null) {
+        try {
+            const response = await fetch(`${this.apiURL}/sessions`, {
+                method: 'POST',
+                headers: this.headers({ 'Content-Type': 'application/json' }),
+                body: JSON.stringify({
+                    code,
+                    lesson_id: lessonId,
+                    exercise_id: exerciseId
                 })
             });
             const data = await response.json();
+            if (!response.ok) throw new Error(data.error || 'Failed to start session');
+            return data;
+        } catch (error) {
+            console.error('Error starting session:', error);
+            throw error;
+        }
+    }
+
+    async sendSessionInput(sessionId, line) {
+        try {
+            const response = await fetch(`${this.apiURL}/sessions/${sessionId}/input`, {
+                method: 'POST',
+                headers: this.headers({ 'Content-Type': 'application/json' }),
+                body: JSON.stringify({ line })
+            });
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || 'Failed to send input');
+            return data;
+        } catch (error) {
+            console.error(`Error sending input to session ${sessionId}:`, error);
+            throw error;
+        }
+    }
+
+    async stopSession(sessionId) {
+        try {
+            await fetch(`${this.apiURL}/sessions/${sessionId}`, {
+                method: 'DELETE',
+                headers: this.headers()
+            });
+        } catch (error) {
+            console.error(`Error stopping session ${sessionId}:`, error);
+        }
+    }
+
+    async testExercise(exerciseId, code) {
+        try {
+            // The server grades against the exercise's own test cases
+            const response = await fetch(`${this.apiURL}/exercises/${exerciseId}/test`, {
+                method: 'POST',
+                headers: this.headers({ 'Content-Type': 'application/json' }),
+                body: JSON.stringify({ code })
+            });
+            const data = await response.json();
             if (!response.ok) throw new Error(data.error || 'Failed to test exercise');
             return data;
         } catch (error) {
@@ -99,7 +269,7 @@ class API {
     // ==================== Progress ====================
     async getProgress() {
         try {
-            const response = await fetch(`${this.apiURL}/progress`);
+            const response = await fetch(`${this.apiURL}/progress`, { headers: this.headers() });
             const data = await response.json();
             if (!response.ok) throw new Error(data.error || 'Failed to load progress');
             return data;
@@ -109,6 +279,27 @@ class API {
         }
     }
 
+    /**
+     * Upload queued progress events and get the progress changed since the last sync
+     */
+    async syncProgress(events, since = null, { keepalive = false } = {}) {
+        try {
+            const response = await fetch(`${this.apiURL}/progress/sync`, {
+                method: 'POST',
+                headers: this.headers({ 'Content-Type': 'application/json' }),
+                body: JSON.stringify({ events, since }),
+                // Lets the last upload finish while the page is closing
+                keepalive
+            });
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || 'Failed to sync progress');
+            return data;
+        } catch (error) {
+            console.error('Error syncing progress:', error);
+            throw error;
+        }
+    }
+
     // ==================== Health Check ====================
     async healthCheck() {
         try {
@@ -314,7 +314,9 @@ class LearningApp {
 
         try {
             const lesson = this.progressTracker.getCurrentLesson();
-            const result = await this.editor.run(this.api, lesson?.id);
+            // Runs of the practice exercise are recorded as submissions
+            const exercise = lesson?.sections?.find(s => s.type === 'practice')?.exercise;
+            const result = await this.editor.run(this.api, lesson?.id, exercise?.id);
         } catch (error) {
             console.error('Error running code:', error);
         }
@@ -331,17 +333,12 @@ class LearningApp {
             const practiceSection = lesson.sections?.find(s => s.type === 'practice');
             const exercise = practiceSection?.exercise;
 
-            if (!exercise || !exercise.test_cases) {
+            if (!exercise) {
                 alert('Bu egzersiz için test yapılamaz');
                 return;
             }
 
-            const result = await this.editor.test(
-                this.api,
-                exercise.id,
-                exercise.test_cases,
-                lesson.id
-            );
+            const result = await this.editor.test(this.api, exercise.id);
 
             if (result && result.success) {
                 alert('🎉 Tebrikler! Tüm testler başarılı!');
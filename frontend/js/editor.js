@@ -83,23 +83,31 @@ class CodeEditor {
             return;
         }
 
+        // Programs reading input() run in a session and ask the user for each line
+        if (/\binput\s*\(/.test(code)) {
+            return this.runInteractive(api, code, lessonId, exerciseId);
+        }
+
         try {
             // Show loading state
             this.setReadOnly(true);
 
-            const result = await api.executeCode(code, lessonId, exerciseId);
+            // Output is shown as the program writes it
+            this.displayOutput('', 'info');
+            let output = '';
 
-            if (result.success) {
-                const execution = result.execution;
-                if (execution.success) {
-                    this.displayOutput(execution.output, 'success');
-                } else {
-                    this.displayOutput(execution.error, 'error');
-                }
-                return execution;
+            const execution = await api.executeCodeStream(code, lessonId, exerciseId, (text) => {
+                output += text;
+                this.appendOutput(text);
+            });
+
+            output += execution.output || '';
+            if (execution.success) {
+                this.displayOutput(output, 'success');
             } else {
-                this.displayOutput(result.error, 'error');
+                this.displayOutput(output ? `${output}\n${execution.error}` : execution.error, 'error');
             }
+            return execution;
         } catch (error) {
             this.displayOutput(`Hata: ${error.message}`, 'error');
         } finally {
@@ -107,10 +115,74 @@ class CodeEditor {
         }
     }
 
+    /**
+     * Run code in an interactive session, reading input() lines from the console
+     */
+    async runInteractive(api, code, lessonId = null, exerciseId = null) {
+        let sessionId = null;
+
+        try {
+            this.setReadOnly(true);
+            this.displayOutput('', 'info');
+            let output = '';
+
+            let state = (await api.startSession(code, lessonId, exerciseId)).session;
+            sessionId = state.session_id;
+
+            while (true) {
+                output += state.output;
+                this.appendOutput(state.output);
+                if (!state.waiting_input) break;
+
+                const line = await this.readConsoleLine();
+                output += line + '\n';
+                state = (await api.sendSessionInput(sessionId, line)).session;
+            }
+            sessionId = null;
+
+            const execution = state.result;
+            output += execution.output || '';
+            if (execution.success) {
+                this.displayOutput(output, 'success');
+            } else {
+                this.displayOutput(output ? `${output}\n${execution.error}` : execution.error, 'error');
+            }
+            return execution;
+        } catch (error) {
+            if (sessionId) api.stopSession(sessionId);
+            this.displayOutput(`Hata: ${error.message}`, 'error');
+        } finally {
+            this.setReadOnly(false);
+        }
+    }
+
+    /**
+     * Show an input field at the end of the console and wait for a line
+     */
+    readConsoleLine() {
+        const consoleEl = document.getElementById('console-output');
+        if (!consoleEl) return Promise.resolve('');
+
+        return new Promise(resolve => {
+            const inputEl = document.createElement('input');
+            inputEl.type = 'text';
+            inputEl.className = 'console-input';
+            inputEl.addEventListener('keydown', (event) => {
+                if (event.key !== 'Enter') return;
+                const line = inputEl.value;
+                inputEl.remove();
+                this.appendOutput(line + '\n');
+                resolve(line);
+            });
+            consoleEl.appendChild(inputEl);
+            inputEl.focus();
+        });
+    }
+
     /**
      * Test code against test cases
      */
-    async test(api, exerciseId, testCases, lessonId = null) {
+    async test(api, exerciseId) {
         const code = this.getCode();
 
         if (!code.trim()) {
@@ -121,7 +193,7 @@ class CodeEditor {
         try {
             this.setReadOnly(true);
 
-            const result = await api.testExercise(exerciseId, code, testCases, lessonId);
+            const result = await api.testExercise(exerciseId, code);
 
             if (result.success) {
                 const testResult = result.test_result;
@@ -166,6 +238,17 @@ class CodeEditor {
         }
     }
 
+    /**
+     * Append output to the console area without redrawing it
+     */
+    appendOutput(text) {
+        const consoleEl = document.getElementById('console-output');
+        if (consoleEl) {
+            consoleEl.appendChild(document.createTextNode(text));
+            consoleEl.scrollTop = consoleEl.scrollHeight;
+        }
+    }
+
     /**
      * Clear console output
      */
@@ -1,8 +1,23 @@
 /**
  * Progress Tracker
  * Manages user progress and state
+ *
+ * Completions are recorded locally first and queued as events. The queue is
+ * uploaded in batches to /api/progress/sync a moment after the last change,
+ * when the connection comes back and when the page is hidden, so flaky
+ * networks cost a few small requests instead of one per action.
  */
 
+// Most events the server accepts in one sync
+const SYNC_BATCH_SIZE = 500;
+
+// Wait this long after a change for more changes before syncing
+const SYNC_DELAY = 2000;
+
+// Wait before retrying a failed sync, doubled up to SYNC_MAX_RETRY_DELAY
+const SYNC_RETRY_DELAY = 5000;
+const SYNC_MAX_RETRY_DELAY = 60000;
+
 class ProgressTracker {
     constructor(api) {
         this.api = api;
@@ -10,25 +25,101 @@ class ProgressTracker {
         this.lessons = [];
         this.currentLesson = null;
         this.storageKey = 'py-learning-progress';
+        this.queueKey = 'py-learning-progress-queue';
+
+        // lesson id -> { completed, passed_exercises }, kept up to date by sync deltas
+        this.lessonProgress = {};
+        this.syncToken = null;
+        this.pendingEvents = [];
+        this.syncTimer = null;
+        this.syncing = null;
+        this.retryDelay = SYNC_RETRY_DELAY;
 
         this.loadFromStorage();
+
+        window.addEventListener('online', () => this.sync());
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden' && this.pendingEvents.length) {
+                this.sync({ keepalive: true });
+            }
+        });
     }
 
     /**
-     * Load progress from API
+     * Load progress from API, uploading events queued while offline
      */
     async loadProgress() {
-        try {
-            const result = await this.api.getProgress();
-            if (result.success) {
+        await this.sync();
+        return this.progress;
+    }
+
+    /**
+     * Upload queued events and apply the progress changed since the last sync
+     */
+    async sync(options = {}) {
+        if (this.syncing) return this.syncing;
+
+        clearTimeout(this.syncTimer);
+        this.syncTimer = null;
+
+        this.syncing = (async () => {
+            const batch = this.pendingEvents.slice(0, SYNC_BATCH_SIZE);
+            try {
+                const result = await this.api.syncProgress(batch, this.syncToken, options);
+                if (!result.success) return false;
+
+                // Events recorded during the request stay queued
+                this.pendingEvents = this.pendingEvents.slice(batch.length);
+                this.savePendingEvents();
+
+                this.syncToken = result.sync_token;
+                (result.lessons || []).forEach(lesson => {
+                    this.lessonProgress[lesson.lesson_id] = {
+                        completed: lesson.completed,
+                        passed_exercises: lesson.passed_exercises
+                    };
+                });
                 this.progress = result.progress;
                 this.saveToStorage();
-                return this.progress;
+
+                this.retryDelay = SYNC_RETRY_DELAY;
+                if (this.pendingEvents.length) this.scheduleSync(0);
+                return true;
+            } catch (error) {
+                console.error('Error syncing progress:', error);
+                this.scheduleSync(this.retryDelay);
+                this.retryDelay = Math.min(this.retryDelay * 2, SYNC_MAX_RETRY_DELAY);
+                return false;
+            } finally {
+                this.syncing = null;
             }
-        } catch (error) {
-            console.error('Error loading progress:', error);
-        }
-        return null;
+        })();
+        return this.syncing;
+    }
+
+    /**
+     * Sync after delay, unless another sync is scheduled sooner
+     */
+    scheduleSync(delay = SYNC_DELAY) {
+        clearTimeout(this.syncTimer);
+        this.syncTimer = setTimeout(() => {
+            // Offline, the online event starts the next sync
+            if (navigator.onLine === false) return;
+            this.sync();
+        }, delay);
+    }
+
+    /**
+     * Queue a progress event for the next sync
+     */
+    recordEvent(event) {
+        const eventId = window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+        this.pendingEvents.push({ event_id: eventId, at: Date.now(), ...event });
+        this.savePendingEvents();
+        this.scheduleSync();
     }
 
     /**
@@ -104,20 +195,23 @@ class ProgressTracker {
     }
 
     /**
-     * Mark lesson as complete
+     * Mark lesson as complete, right away locally and on the server with the next sync
      */
     async markLessonComplete(lessonId) {
-        try {
-            const result = await this.api.completeLesson(lessonId);
-            if (result.success) {
-                this.progress = result.progress;
-                this.saveToStorage();
-                return true;
-            }
-        } catch (error) {
-            console.error('Error marking lesson complete:', error);
+        this.recordEvent({ type: 'lesson_complete', lesson_id: lessonId });
+
+        const lessonProgress = this.lessonProgress[lessonId] || { completed: false, passed_exercises: 0 };
+        if (!lessonProgress.completed && this.progress) {
+            const completed = this.progress.completed + 1;
+            this.progress = {
+                ...this.progress,
+                completed,
+                percentage: this.progress.total ? completed / this.progress.total * 100 : 0
+            };
         }
-        return false;
+        this.lessonProgress[lessonId] = { ...lessonProgress, completed: true };
+        this.saveToStorage();
+        return true;
     }
 
     /**
@@ -145,9 +239,7 @@ class ProgressTracker {
      * Is lesson completed
      */
     isLessonCompleted(lessonId) {
-        // This would require storing individual lesson completion status
-        // For now, just check if it's before or equal to the completed count
-        return false;
+        return Boolean(this.lessonProgress[lessonId]?.completed);
     }
 
     /**
@@ -158,11 +250,20 @@ class ProgressTracker {
             lessons: this.lessons,
             progress: this.progress,
             currentLesson: this.currentLesson,
+            lessonProgress: this.lessonProgress,
+            syncToken: this.syncToken,
             timestamp: new Date().toISOString()
         };
         localStorage.setItem(this.storageKey, JSON.stringify(data));
     }
 
+    /**
+     * Save the event queue, separately as it changes more often than the rest
+     */
+    savePendingEvents() {
+        localStorage.setItem(this.queueKey, JSON.stringify(this.pendingEvents));
+    }
+
     /**
      * Load state from localStorage
      */
@@ -173,7 +274,10 @@ class ProgressTracker {
                 this.lessons = data.lessons || [];
                 this.progress = data.progress || null;
                 this.currentLesson = data.currentLesson || null;
+                this.lessonProgress = data.lessonProgress || {};
+                this.syncToken = data.syncToken || null;
             }
+            this.pendingEvents = JSON.parse(localStorage.getItem(this.queueKey)) || [];
         } catch (error) {
             console.error('Error loading from storage:', error);
         }
@@ -184,9 +288,13 @@ class ProgressTracker {
      */
     clearStorage() {
         localStorage.removeItem(this.storageKey);
+        localStorage.removeItem(this.queueKey);
         this.lessons = [];
         this.progress = null;
         this.currentLesson = null;
+        this.lessonProgress = {};
+        this.syncToken = null;
+        this.pendingEvents = [];
     }
 
     /**